@@ -1,15 +1,201 @@
 import os
+import io
+import time
+import json
+import hashlib
+import argparse
+import importlib.util
+import threading
 import requests
 import re
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 from markdownify import markdownify as md
 from urllib.parse import urljoin, urlparse
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
+import gpp_metrics
+
+try:
+    from PIL import Image  # Optionnel : uniquement pour --optimize-images / --max-image-size
+except ImportError:
+    Image = None
+
+try:
+    import lxml  # noqa: F401  Optionnel : parser HTML plus rapide que html.parser
+    DEFAULT_PARSER = "lxml"
+except ImportError:
+    DEFAULT_PARSER = "html.parser"
 
 # CONSTANTES
 BASE_URL = "https://gameprogrammingpatterns.com/"
 CONTENTS_URL = urljoin(BASE_URL, "contents.html")
 OUTPUT_DIR = "book"
+# Images stockées une seule fois, nommées d'après leur contenu, et partagées par tous les chapitres
+ASSETS_DIR = os.path.join(OUTPUT_DIR, "assets")
+
+# Optimisation des images (nécessite Pillow)
+OPTIMIZE_IMAGES = False  # Ré-encode les PNG/JPEG et garde la version la plus légère
+MAX_IMAGE_SIZE = 0       # Dimension maximale en pixels (0 = taille d'origine)
+JPEG_QUALITY = 85
+
+# Parallélisme : 1 worker = comportement séquentiel historique.
+DEFAULT_WORKERS = 1
+# Nombre maximum de connexions keep-alive ouvertes simultanément vers un même hôte
+MAX_CONNECTIONS_PER_HOST = 4
+
+# Conversion HTML -> Markdown (CPU) : parser BeautifulSoup et processus dédiés
+HTML_PARSER = DEFAULT_PARSER
+CONVERT_WORKERS = os.cpu_count() or 1  # 0 = conversion dans le thread qui a récupéré la page
+# Pool de processus de conversion, alimenté par les threads de récupération (créé dans main())
+CONVERSION_POOL: Optional[ProcessPoolExecutor] = None
+# Lecture seule du cache HTTP : aucune requête, pour reconvertir les pages déjà téléchargées
+OFFLINE = False
+
+def create_session(max_connections: int = MAX_CONNECTIONS_PER_HOST) -> requests.Session:
+    """
+    Crée une session HTTP partagée (keep-alive) dont le pool est limité par hôte.
+    pool_block=True fait attendre les threads en trop au lieu d'ouvrir des connexions supplémentaires.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_connections, pool_block=True)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+# Session unique réutilisée par get_soup() et download_image()
+SESSION = create_session()
+
+# Cache HTTP sur disque (validateurs ETag/Last-Modified + corps des pages et images d'origine)
+HTTP_CACHE_DIR = os.path.join(".cache", "http")
+USE_HTTP_CACHE = True
+
+# Statistiques réseau de la session (partagées entre threads)
+HTTP_STATS = {"requests": 0, "not_modified": 0, "bytes": 0}
+_stats_lock = threading.Lock()
+
+# Statistiques des images : références trouvées dans les pages et octets qu'elles auraient occupés
+ASSET_STATS = {"references": 0, "referenced_bytes": 0}
+_assets_used = set()
+# URL -> (fichier partagé, taille d'origine) : une image référencée par plusieurs pages n'est demandée qu'une fois par run
+_image_memo: Dict[str, Tuple[str, int]] = {}
+
+def count_response(response: requests.Response, size: int) -> None:
+    """Comptabilise une réponse HTTP dans HTTP_STATS."""
+    with _stats_lock:
+        HTTP_STATS["requests"] += 1
+        HTTP_STATS["bytes"] += size
+        if response.status_code == 304:
+            HTTP_STATS["not_modified"] += 1
+    gpp_metrics.count("http.requests")
+    gpp_metrics.count("http.bytes", size)
+    if response.status_code == 304:
+        gpp_metrics.count("http.not_modified")
+
+def atomic_write(path: str, data: bytes) -> None:
+    """Écrit un fichier via un fichier temporaire + rename (jamais de fichier à moitié écrit)."""
+    tmp_path = f"{path}.tmp{threading.get_ident()}"
+    with gpp_metrics.span("disk.write"):
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+def write_text_if_changed(path: str, text: str) -> bool:
+    """Écrit le texte seulement s'il diffère du contenu actuel. Retourne True si le fichier a été écrit."""
+    data = text.encode('utf-8')
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    atomic_write(path, data)
+    return True
+
+def cache_paths(key: str) -> Tuple[str, str]:
+    """Retourne les chemins (métadonnées, corps) du cache HTTP pour une clé."""
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return (os.path.join(HTTP_CACHE_DIR, f"{digest}.json"),
+            os.path.join(HTTP_CACHE_DIR, f"{digest}.body"))
+
+def load_cache_meta(key: str) -> Dict[str, Any]:
+    """Charge les validateurs stockés pour une clé (dict vide si absent ou cache désactivé)."""
+    if not USE_HTTP_CACHE: return {}
+    meta_path, _ = cache_paths(key)
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache_json(key: str, data: Dict[str, Any]) -> None:
+    """Enregistre des métadonnées arbitraires dans le cache pour une clé."""
+    os.makedirs(HTTP_CACHE_DIR, exist_ok=True)
+    meta_path, _ = cache_paths(key)
+    atomic_write(meta_path, json.dumps(data).encode('utf-8'))
+
+def save_cache_meta(key: str, response: requests.Response, body_hash: str) -> None:
+    """Enregistre les validateurs de la réponse pour les prochaines requêtes conditionnelles."""
+    save_cache_json(key, {
+        "url": response.url,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "sha256": body_hash,
+    })
+
+def conditional_headers(meta: Dict[str, Any]) -> Dict[str, str]:
+    """Construit les en-têtes If-None-Match / If-Modified-Since à partir des validateurs."""
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    return headers
+
+def fetch_bytes(url: str) -> Tuple[Optional[bytes], bool]:
+    """
+    Récupère une ressource via le cache conditionnel.
+    Retourne (contenu, modifié) ; modifié vaut False si le serveur répond 304
+    ou renvoie exactement le même contenu que la version en cache.
+    """
+    meta = load_cache_meta(url)
+    _, body_path = cache_paths(url)
+    if meta and not os.path.exists(body_path):
+        meta = {}
+
+    if OFFLINE:
+        if not meta:
+            print(f"[ERREUR] Hors ligne : {url} absent du cache")
+            return None, False
+        with open(body_path, 'rb') as f:
+            return f.read(), False
+
+    try:
+        with gpp_metrics.span("http.fetch"):
+            response = SESSION.get(url, headers=conditional_headers(meta))
+        if response.status_code == 304 and meta:
+            count_response(response, 0)
+            with open(body_path, 'rb') as f:
+                return f.read(), False
+        response.raise_for_status()
+        body = response.content
+        count_response(response, len(body))
+    except requests.exceptions.RequestException as e:
+        print(f"[ERREUR] Impossible de récupérer {url} : {e}")
+        return None, False
+
+    body_hash = hashlib.sha256(body).hexdigest()
+    changed = body_hash != meta.get("sha256")
+    if USE_HTTP_CACHE:
+        os.makedirs(HTTP_CACHE_DIR, exist_ok=True)
+        if changed:
+            atomic_write(body_path, body)
+        save_cache_meta(url, response, body_hash)
+    return body, changed
+
+def fetch_html(url: str) -> Tuple[Optional[str], bool]:
+    """Récupère une page HTML via le cache conditionnel. Retourne (html, modifié)."""
+    body, changed = fetch_bytes(url)
+    if body is None: return None, False
+    return body.decode('utf-8', errors='replace'), changed
 
 def setup_directories() -> None:
     """Crée le répertoire racine du livre s'il n'existe pas."""
@@ -18,15 +204,11 @@ def setup_directories() -> None:
         print(f"[INFO] Dossier de sortie initialisé : {os.path.abspath(OUTPUT_DIR)}")
 
 def get_soup(url: str) -> Optional[BeautifulSoup]:
-    """Récupère le contenu HTML d'une URL et retourne un objet BeautifulSoup."""
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        response.encoding = 'utf-8'
-        return BeautifulSoup(response.text, 'html.parser')
-    except requests.exceptions.RequestException as e:
-        print(f"[ERREUR] Impossible de récupérer {url} : {e}")
-        return None
+    """Récupère le contenu HTML d'une URL (via le cache HTTP) et retourne un objet BeautifulSoup."""
+    html, _ = fetch_html(url)
+    if html is None: return None
+    with gpp_metrics.span("html.parse"):
+        return BeautifulSoup(html, HTML_PARSER)
 
 def int_to_roman(n: int) -> str:
     """Convertit un entier en chiffres romains (majuscules)."""
@@ -126,69 +308,259 @@ def get_toc_structure() -> List[Dict]:
 
     return structure
 
-def download_image(img_url: str, save_dir: str) -> Optional[str]:
-    """Télécharge une image et retourne son nom local."""
+def image_options_tag() -> str:
+    """Options de traitement réellement appliquées aux images (entrent dans le nom des fichiers)."""
+    if Image is None or not (OPTIMIZE_IMAGES or MAX_IMAGE_SIZE):
+        return ""
+    return f"|opt={OPTIMIZE_IMAGES}|max={MAX_IMAGE_SIZE}|q={JPEG_QUALITY}"
+
+def optimize_image(data: bytes, ext: str) -> bytes:
+    """
+    Réduit (MAX_IMAGE_SIZE) et/ou ré-encode (OPTIMIZE_IMAGES) une image PNG/JPEG avec Pillow.
+    Retourne les octets d'origine si rien n'est à faire ou si le résultat n'est pas plus léger.
+    """
+    if not image_options_tag() or ext not in (".png", ".jpg", ".jpeg"):
+        return data
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            resized = bool(MAX_IMAGE_SIZE) and max(img.size) > MAX_IMAGE_SIZE
+            if resized:
+                img.thumbnail((MAX_IMAGE_SIZE, MAX_IMAGE_SIZE), Image.LANCZOS)
+            out = io.BytesIO()
+            if ext == ".png":
+                img.save(out, "PNG", optimize=True)
+            else:
+                img = img if img.mode in ("RGB", "L") else img.convert("RGB")
+                img.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        result = out.getvalue()
+        return result if resized or len(result) < len(data) else data
+    except Exception as e:
+        print(f"      [ATTENTION IMG] Optimisation impossible, image conservée telle quelle : {e}")
+        return data
+
+def download_image(img_url: str) -> Optional[str]:
+    """
+    Télécharge une image (via le cache conditionnel) et la range dans ASSETS_DIR sous un nom
+    dérivé de son contenu : une image utilisée par plusieurs chapitres n'est stockée qu'une fois.
+    Retourne le chemin du fichier partagé.
+    """
     try:
         full_img_url = urljoin(BASE_URL, img_url)
-        filename = os.path.basename(urlparse(full_img_url).path).split('?')[0]
-        if not filename: return None
+        ext = os.path.splitext(urlparse(full_img_url).path)[1].lower()
+        if not os.path.basename(urlparse(full_img_url).path): return None
 
-        os.makedirs(save_dir, exist_ok=True)
-        save_path = os.path.join(save_dir, filename)
-        
-        if not os.path.exists(save_path):
-            resp = requests.get(full_img_url, stream=True)
-            if resp.status_code == 200:
-                with open(save_path, 'wb') as f:
-                    for chunk in resp.iter_content(1024): f.write(chunk)
-            else: return None
-        return filename
+        with _stats_lock:
+            memo = _image_memo.get(full_img_url)
+        if memo:
+            asset_path, size = memo
+            gpp_metrics.count("image.memo_hit")
+        else:
+            with gpp_metrics.span("image.download"):
+                data, _ = fetch_bytes(full_img_url)
+            if data is None: return None
+
+            name = hashlib.sha256(data + image_options_tag().encode('utf-8')).hexdigest()[:16] + ext
+            asset_path = os.path.join(ASSETS_DIR, name)
+            if not os.path.exists(asset_path):
+                os.makedirs(ASSETS_DIR, exist_ok=True)
+                with gpp_metrics.span("image.optimize"):
+                    stored = optimize_image(data, ext)
+                atomic_write(asset_path, stored)
+                gpp_metrics.count("image.stored")
+            size = len(data)
+
+        with _stats_lock:
+            _image_memo[full_img_url] = (asset_path, size)
+            ASSET_STATS["references"] += 1
+            ASSET_STATS["referenced_bytes"] += size
+            _assets_used.add(asset_path)
+        return asset_path
     except Exception as e:
         print(f"      [ERREUR IMG] {e}")
         return None
 
-def process_page(url: str, save_dir: str, title: str) -> str:
-    """Scrape une page HTML, extrait le contenu, télécharge images, convertit en MD."""
-    soup = get_soup(url)
-    if not soup: return ""
+def report_assets() -> None:
+    """Affiche le gain de la déduplication et de l'optimisation des images."""
+    if not ASSET_STATS["references"]: return
+    stored = sum(os.path.getsize(path) for path in _assets_used if os.path.exists(path))
+    saved = ASSET_STATS["referenced_bytes"] - stored
+    print(f"[IMAGES] {ASSET_STATS['references']} références, {len(_assets_used)} fichiers uniques, "
+          f"{stored / 1024:.1f} Ko stockés, {saved / 1024:.1f} Ko économisés "
+          f"({100 * saved / max(1, ASSET_STATS['referenced_bytes']):.0f}%)")
+
+# Jeton temporaire remplaçant le src de chaque image pendant la conversion
+IMAGE_TOKEN = "gpp-image-{}"
+IMAGE_TOKEN_RE = re.compile(r'gpp-image-(\d+)')
 
-    content = soup.find('div', class_='content') or soup.body
+def convert_html(html: str, title: str, parser: str = "html.parser") -> Tuple[str, List[str]]:
+    """
+    Étape de conversion (CPU pur, sans réseau) : extrait le contenu, remplace chaque image par un jeton
+    et convertit en Markdown. Fonction de niveau module pour pouvoir tourner dans un processus séparé.
+    Retourne (markdown avec jetons, src d'origine des images dans l'ordre des jetons).
+    """
+    soup = BeautifulSoup(html, parser)
+    content = soup.find('div', class_='content') or soup.body or soup
     # Nettoyage
     for tag in content.find_all(['nav', 'script', 'style', 'footer']): tag.decompose()
-    
-    # Images
-    images_dir = os.path.join(save_dir, "images")
+
+    image_srcs = []
     for img in content.find_all('img'):
         src = img.get('src')
         if src:
-            filename = download_image(src, images_dir)
-            if filename: img['src'] = f"images/{filename}"
+            img['src'] = IMAGE_TOKEN.format(len(image_srcs))
+            image_srcs.append(src)
 
-    # Conversion
     markdown_text = md(str(content), heading_style="atx", code_language="cpp")
     markdown_text = re.sub(r'\n{3,}', '\n\n', markdown_text).strip()
-    
+
     if not markdown_text.startswith('#'):
         markdown_text = f"# {title}\n\n{markdown_text}"
+    return markdown_text, image_srcs
 
-    slug = slugify_name(title)
-    md_path = os.path.join(save_dir, f"{slug}.md")
-    with open(md_path, 'w', encoding='utf-8') as f:
-        f.write(markdown_text)
-    
-    return f"{slug}.md"
+def start_conversion_pool(workers: int) -> Optional[ProcessPoolExecutor]:
+    """
+    Crée le pool de conversion (None si workers vaut 0) et démarre ses processus tout de suite,
+    depuis le thread principal : ils ne sont pas créés plus tard par un thread de récupération.
+    """
+    if workers <= 0:
+        return None
+    pool = ProcessPoolExecutor(max_workers=workers)
+    list(pool.map(abs, range(workers)))
+    return pool
 
-def main():
-    print("=== DÉBUT RESTRUCTURATION GPP ===")
-    setup_directories()
-    
-    structure = get_toc_structure()
-    if not structure:
-        print("[ERREUR] Structure non récupérée.")
+def run_conversion(html: str, title: str) -> Tuple[str, List[str]]:
+    """Convertit une page dans le pool de processus s'il existe, sinon dans le thread courant."""
+    with gpp_metrics.span("convert"):
+        if CONVERSION_POOL is not None:
+            return CONVERSION_POOL.submit(convert_html, html, title, HTML_PARSER).result()
+        return convert_html(html, title, HTML_PARSER)
+
+def process_page(url: str, save_dir: str, title: str) -> str:
+    """
+    Scrape une page HTML, la convertit en MD (pool de processus) et télécharge ses images.
+    Si la page et ses images n'ont pas changé depuis le dernier passage, le .md existant est conservé tel quel.
+    """
+    # Mesures rattachées au dossier du chapitre, comme dans les rapports de traduction et d'EPUB
+    chapter_key = os.path.relpath(save_dir, OUTPUT_DIR).replace(os.sep, '/')
+    with gpp_metrics.chapter(chapter_key), gpp_metrics.span("page"):
+        html, _ = fetch_html(url)
+        if html is None: return ""
+
+        slug = slugify_name(title)
+        md_path = os.path.join(save_dir, f"{slug}.md")
+
+        # HTML inchangé : on réutilise la conversion précédente (avec jetons) sans reparser la page
+        render_key = f"render|{os.path.abspath(md_path)}"
+        state = load_cache_meta(render_key)
+        html_hash = hashlib.sha256(html.encode('utf-8')).hexdigest()
+        if state.get("html_hash") == html_hash and "markdown" in state:
+            template, image_srcs = state["markdown"], state["srcs"]
+            gpp_metrics.count("page.conversion_reused")
+        else:
+            template, image_srcs = run_conversion(html, title)
+            gpp_metrics.count("page.converted")
+
+        # Images : chemin relatif vers la copie partagée dans ASSETS_DIR (src d'origine en cas d'échec)
+        links = []
+        for src in image_srcs:
+            asset_path = download_image(src)
+            links.append(os.path.relpath(asset_path, save_dir).replace(os.sep, '/') if asset_path else src)
+
+        # Source et images inchangées : le fichier n'est pas touché
+        signature = hashlib.sha256(json.dumps([html_hash, links]).encode('utf-8')).hexdigest()
+        if state.get("signature") == signature and os.path.exists(md_path):
+            gpp_metrics.count("page.unchanged")
+            return f"{slug}.md"
+
+        markdown_text = IMAGE_TOKEN_RE.sub(
+            lambda m: links[int(m.group(1))] if int(m.group(1)) < len(links) else m.group(0), template)
+        write_text_if_changed(md_path, markdown_text)
+        if USE_HTTP_CACHE:
+            save_cache_json(render_key, {"signature": signature, "html_hash": html_hash,
+                                         "srcs": image_srcs, "markdown": template})
+
+        return f"{slug}.md"
+
+def scrape_job(url: str, save_dir: str, title: str) -> str:
+    """Scrape une page et affiche le temps passé (utilisable depuis un thread)."""
+    t_start = time.time()
+    filename = process_page(url, save_dir, title)
+    status = "OK" if filename else "ECHEC"
+    # Un seul write() par ligne pour éviter que les sorties des threads ne s'entremêlent
+    print(f"  [{status}] {title} ({time.time()-t_start:.1f}s)\n", end="", flush=True)
+    return filename
+
+def scrape_pages(jobs: List[Tuple[str, str, str]], workers: int) -> List[str]:
+    """
+    Exécute process_page() pour chaque tâche (url, dossier, titre).
+    Retourne les noms de fichiers dans l'ordre des tâches, quel que soit l'ordre de fin.
+    """
+    if workers <= 1:
+        return [scrape_job(url, save_dir, title) for url, save_dir, title in jobs]
+
+    print(f"\n[INFO] Scraping concurrent de {len(jobs)} pages ({workers} workers)...")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(scrape_job, url, save_dir, title) for url, save_dir, title in jobs]
+        return [future.result() for future in futures]
+
+def available_parsers() -> List[str]:
+    """Parsers BeautifulSoup utilisables dans cet environnement."""
+    return ["html.parser"] + [name for name in ("lxml", "html5lib") if importlib.util.find_spec(name)]
+
+def benchmark_parsers(structure: List[Dict], rounds: int = 3) -> None:
+    """
+    Compare le temps d'analyse et d'analyse+conversion par page pour chaque parser disponible,
+    puis le débit de conversion du livre entier dans le pool de processus.
+    Les pages viennent du cache HTTP (à combiner avec --offline pour ne faire aucune requête).
+    """
+    pages = []
+    for item in structure:
+        for entry in ([item] if item['type'] == 'preface' else item['chapters']):
+            html, _ = fetch_html(entry['url'])
+            if html is not None:
+                pages.append((entry['title'], html))
+    if not pages:
+        print("[ERREUR] Aucune page à mesurer.")
         return
 
+    print(f"\n[BENCH] {len(pages)} pages, meilleur temps sur {rounds} passes")
+    for parser in available_parsers():
+        parse_time = convert_time = float('inf')
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            for _, html in pages:
+                BeautifulSoup(html, parser)
+            t1 = time.perf_counter()
+            for title, html in pages:
+                convert_html(html, title, parser)
+            t2 = time.perf_counter()
+            parse_time, convert_time = min(parse_time, t1 - t0), min(convert_time, t2 - t1)
+        print(f"  {parser:<12} analyse {parse_time * 1000 / len(pages):7.2f} ms/page | "
+              f"analyse+conversion {convert_time * 1000 / len(pages):7.2f} ms/page")
+
+    if CONVERT_WORKERS > 1:
+        titles = [title for title, _ in pages]
+        htmls = [html for _, html in pages]
+        with ProcessPoolExecutor(max_workers=CONVERT_WORKERS) as pool:
+            # Premier passage pour démarrer les processus, hors mesure
+            list(pool.map(convert_html, htmls, titles, [HTML_PARSER] * len(pages)))
+            t0 = time.perf_counter()
+            list(pool.map(convert_html, htmls, titles, [HTML_PARSER] * len(pages)))
+            elapsed = time.perf_counter() - t0
+        print(f"  pool {CONVERT_WORKERS} processus ({HTML_PARSER}) : {elapsed * 1000 / len(pages):7.2f} ms/page")
+
+def plan_book(structure: List[Dict]) -> Tuple[List[Tuple[str, str, str]], List[str], List[Tuple[int, str, str, str]]]:
+    """
+    Prépare l'arborescence du livre et les tâches de scraping (url, dossier, titre) dans l'ordre de la table
+    des matières. Retourne aussi le squelette du README et, pour chaque tâche, l'emplacement de sa ligne.
+    """
     readme_content = ["# Game Programming Patterns\n", "> Table des matières hiérarchique.\n"]
 
+    # On prépare d'abord l'arborescence et les tâches, puis on scrape (éventuellement en parallèle).
+    # Chaque tâche réserve sa ligne dans le README pour conserver l'ordre de la table des matières.
+    jobs = []
+    readme_slots = []  # (index dans readme_content, puce, titre, dossier relatif)
+
     for item in structure:
             if item['type'] == 'preface':
                 # i-acknowledgements
@@ -197,11 +569,9 @@ def main():
                 os.makedirs(section_path, exist_ok=True)
                 
                 print(f"[PREFACE] {item['title']} -> {folder_name}")
-                filename = process_page(item['url'], section_path, item['title'])
-                
-                if filename:
-                    rel_path = f"{folder_name}/{filename}".replace('\\', '/')
-                    readme_content.append(f"- [{item['title']}]({rel_path})")
+                jobs.append((item['url'], section_path, item['title']))
+                readme_slots.append((len(readme_content), "- ", item['title'], folder_name))
+                readme_content.append("")
 
             elif item['type'] == 'section':
                 # I-introduction, II-design-patterns-revisited...
@@ -219,17 +589,96 @@ def main():
                     os.makedirs(chap_path, exist_ok=True)
                     
                     print(f"  [CHAPITRE {chap['num']}] {chap['title']}")
-                    filename = process_page(chap['url'], chap_path, chap['title'])
-                    
-                    if filename:
-                        rel_path = f"{section_folder}/{chap_folder}/{filename}".replace('\\', '/')
-                        readme_content.append(f"  {chap['num']}. [{chap['title']}]({rel_path})")
+                    jobs.append((chap['url'], chap_path, chap['title']))
+                    readme_slots.append((len(readme_content), f"  {chap['num']}. ", chap['title'], f"{section_folder}/{chap_folder}"))
+                    readme_content.append("")
+
+    return jobs, readme_content, readme_slots
+
+def write_readme(readme_content: List[str], readme_slots: List[Tuple[int, str, str, str]], filenames: List[str]) -> None:
+    """Complète le squelette du README avec les fichiers produits (dans l'ordre des tâches) et l'écrit."""
+    readme_content = list(readme_content)
+    for (index, bullet, title, folder), filename in zip(readme_slots, filenames):
+        if filename:
+            rel_path = f"{folder}/{filename}".replace('\\', '/')
+            readme_content[index] = f"{bullet}[{title}]({rel_path})"
+        else:
+            readme_content[index] = None
+
+    # README.md final (les pages en échec sont omises, comme en mode séquentiel)
+    readme_content = [line for line in readme_content if line is not None]
+    write_text_if_changed(os.path.join(OUTPUT_DIR, "README.md"), "\n".join(readme_content) + "\n")
+
+def main():
+    global SESSION, USE_HTTP_CACHE, OPTIMIZE_IMAGES, MAX_IMAGE_SIZE
+    global HTML_PARSER, CONVERT_WORKERS, CONVERSION_POOL, OFFLINE
+    parser = argparse.ArgumentParser(description="Scraper GPP")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Nombre de pages récupérées en parallèle (1 = séquentiel)")
+    parser.add_argument("--max-connections", type=int, default=MAX_CONNECTIONS_PER_HOST,
+                        help="Nombre maximum de connexions simultanées vers le site")
+    parser.add_argument("--optimize-images", action="store_true",
+                        help="Ré-encode les images PNG/JPEG pour réduire leur poids (nécessite Pillow)")
+    parser.add_argument("--max-image-size", type=int, default=MAX_IMAGE_SIZE, metavar="PX",
+                        help="Réduit les images dont la plus grande dimension dépasse PX pixels (nécessite Pillow)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Ignore les validateurs en cache et force le re-téléchargement et la reconversion")
+    parser.add_argument("--parser", choices=available_parsers(), default=HTML_PARSER,
+                        help=f"Parser HTML utilisé par BeautifulSoup (défaut : {HTML_PARSER})")
+    parser.add_argument("--convert-workers", type=int, default=CONVERT_WORKERS,
+                        help="Processus de conversion HTML -> Markdown (0 = dans les threads de récupération)")
+    parser.add_argument("--offline", action="store_true",
+                        help="N'utilise que le cache HTTP, sans aucune requête (reconversion des pages déjà téléchargées)")
+    parser.add_argument("--bench-parsers", action="store_true",
+                        help="Mesure le temps d'analyse/conversion par page pour chaque parser, sans rien écrire")
+    parser.add_argument("--report", metavar="FICHIER",
+                        help="Rapport de mesures JSON (+ CSV) de l'exécution (défaut : .cache/metrics/scrape.json)")
+    args = parser.parse_args()
+
+    SESSION = create_session(args.max_connections)
+    USE_HTTP_CACHE = not args.no_cache
+    OPTIMIZE_IMAGES = args.optimize_images
+    MAX_IMAGE_SIZE = args.max_image_size
+    HTML_PARSER = args.parser
+    CONVERT_WORKERS = args.convert_workers
+    OFFLINE = args.offline
+    if OFFLINE and not USE_HTTP_CACHE:
+        print("[ERREUR] --offline nécessite le cache HTTP (incompatible avec --no-cache).")
+        return
+    if (OPTIMIZE_IMAGES or MAX_IMAGE_SIZE) and Image is None:
+        print("[ATTENTION] Pillow n'est pas installé (pip install Pillow) : images conservées telles quelles.")
+
+    print("=== DÉBUT RESTRUCTURATION GPP ===")
+    t_start = time.time()
+    setup_directories()
+    
+    structure = get_toc_structure()
+    if not structure:
+        print("[ERREUR] Structure non récupérée.")
+        return
+
+    if args.bench_parsers:
+        benchmark_parsers(structure)
+        return
+
+    jobs, readme_content, readme_slots = plan_book(structure)
+
+    CONVERSION_POOL = start_conversion_pool(CONVERT_WORKERS)
+    try:
+        filenames = scrape_pages(jobs, args.workers)
+    finally:
+        if CONVERSION_POOL is not None:
+            CONVERSION_POOL.shutdown()
+            CONVERSION_POOL = None
+
+    write_readme(readme_content, readme_slots, filenames)
 
-    # README.md final
-    with open(os.path.join(OUTPUT_DIR, "README.md"), 'w', encoding='utf-8') as f:
-        f.write("\n".join(readme_content) + "\n")
+    print(f"\n[RÉSEAU] {HTTP_STATS['requests']} requêtes, {HTTP_STATS['not_modified']} non modifiées (304), "
+          f"{HTTP_STATS['bytes'] / 1024:.1f} Ko téléchargés")
+    report_assets()
+    print(f"[MÉTRIQUES] Rapport : {gpp_metrics.write_report('scrape', args.report)}")
 
-    print("\n=== RESTRUCTURATION TERMINÉE ===")
+    print(f"\n=== RESTRUCTURATION TERMINÉE en {time.time()-t_start:.1f}s ===")
 
 if __name__ == "__main__":
     main()
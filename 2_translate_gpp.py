@@ -1,15 +1,40 @@
 import os
 import time
 import re
+import json
+import hashlib
+import sqlite3
+import threading
 import argparse
-from typing import List, Dict, Optional
+import queue
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Any, Callable, Iterable, Iterator, Tuple, Set
 import ollama
+import gpp_metrics
 
 # --- CONFIGURATION ---
 
 MODEL_NAME = "qwen2.5:7b"
+# Mode cascade : chaque bloc passe d'abord par un modèle plus petit et plus rapide (ex. "qwen2.5:3b").
+# Sa sortie est vérifiée (structure markdown, marqueurs, glossaire, longueur) et seuls les blocs
+# qui échouent sont retraduits par MODEL_NAME. None = MODEL_NAME pour tous les blocs.
+DRAFT_MODEL: Optional[str] = None
+# Bornes du rapport de longueur traduction / source (texte hors code et URL) acceptées pour un brouillon
+DRAFT_LENGTH_RATIO = (0.7, 2.0)
 OUTPUT_DIR = "book"
 
+# Durée pendant laquelle Ollama garde le modèle (et son cache KV) en mémoire entre deux requêtes.
+# Un modèle déchargé doit être rechargé ET réévaluer tout le prompt système au bloc suivant.
+KEEP_ALIVE = "30m"
+
+# Instances Ollama utilisables en parallèle, avec le nombre de requêtes simultanées accepté par chacune.
+# Surchargeable en ligne de commande : --endpoint http://gpu1:11434=2 --endpoint http://gpu2:11434=1
+OLLAMA_ENDPOINTS = [
+    {"host": os.environ.get("OLLAMA_HOST", "http://localhost:11434"), "concurrency": 1},
+]
+
 # Paramètres du modèle pour favoriser la cohérence mais garder de la fluidité
 MODEL_OPTIONS = {
     "temperature": 0.3,
@@ -18,6 +43,41 @@ MODEL_OPTIONS = {
     "repeat_penalty": 1.1,
 }
 
+# Découpage : taille des blocs envoyés au modèle, estimée en tokens
+CHARS_PER_TOKEN = 3.5        # Estimation prudente pour du texte anglais/markdown
+OUTPUT_TOKEN_RATIO = 1.3     # Une traduction française compte ~30% de tokens de plus que la source
+CONTEXT_SAFETY_MARGIN = 256  # Marge pour le gabarit de chat et l'imprécision de l'estimation
+MIN_CHUNK_TOKENS = 256
+MAX_CHUNK_TOKENS = 2048      # Au-delà, la qualité de traduction d'un modèle 7B se dégrade
+
+# Regroupement des petits blocs (titre seul, aparté, courte section) : chacun paierait sinon une requête entière
+# (évaluation du prompt système, ordonnancement, aller-retour HTTP). Un bloc d'au plus BATCH_CHUNK_TOKENS
+# tokens est envoyé avec d'autres, dans la limite de BATCH_MAX_SEGMENTS blocs et BATCH_MAX_TOKENS tokens.
+BATCH_CHUNK_TOKENS = 160
+BATCH_MAX_TOKENS = 1024
+BATCH_MAX_SEGMENTS = 8
+
+# Débits mesurés lors des runs précédents (par modèle), utilisés par --plan pour estimer la durée d'un run.
+# Sans mesure, DEFAULT_THROUGHPUT (ordre de grandeur d'un 7B sur GPU grand public) sert d'estimation.
+THROUGHPUT_PATH = os.path.join(".cache", "throughput.json")
+DEFAULT_THROUGHPUT = {"prompt_tps": 500.0, "output_tps": 25.0, "overhead_s": 0.3}
+
+# Garde-fou contre les générations qui bouclent : la traduction ne doit pas dépasser
+# MAX_OUTPUT_RATIO fois la taille du texte envoyé (+ une marge fixe pour les très petits blocs)
+MAX_OUTPUT_RATIO = 3.0
+OUTPUT_SLACK_CHARS = 400
+
+# Mémoire de traduction persistante (évite de renvoyer au LLM un bloc déjà traduit)
+TRANSLATION_MEMORY_PATH = os.path.join(".cache", "translation_memory.sqlite3")
+TRANSLATION_MEMORY_MAX_BYTES = 256 * 1024 * 1024  # Au-delà, les entrées les moins récemment utilisées sont évincées
+
+# Contexte donné au modèle pour chaque chapitre :
+# - "chain" : résumé du chapitre précédent, les chapitres sont traduits l'un après l'autre ;
+# - "toc"   : plan du livre (book/README.md) + début de la source du chapitre précédent, calculé avant
+#             de commencer : les chapitres sont indépendants et peuvent être traduits en parallèle.
+CONTEXT_MODE = "chain"
+SUMMARY_CACHE_PATH = os.path.join(".cache", "summaries.json")  # Résumés des chapitres déjà traduits
+
 # Glossaire pour assurer la cohérence terminologique
 GLOSSARY = {
     # Termes à NE PAS traduire (garder en anglais pour le jargon dev)
@@ -30,6 +90,9 @@ GLOSSARY = {
         "Decoupling Patterns", "Optimization Patterns",
         "Runtime", "Overhead", "Buffer", "Socket", "Framework", "Template", "Inline"
     ],
+    # Termes ci-dessus qui sont aussi des mots courants : contrôlés seulement quand ils portent une majuscule
+    # (« the State pattern » et non « the state of the world »)
+    "case_sensitive": ["State", "Command", "Component", "Prototype", "Observer", "Template"],
     "translations": {
         "decoupling": "découplage",
         "architecture": "architecture",
@@ -66,39 +129,302 @@ Traduire le contenu Markdown fourni de l'anglais vers le français.
 - **NE JAMAIS** traduire le contenu des blocs de code (entre ``` ou `).
 - **NE JAMAIS** traduire les noms de variables, fonctions, classes ou fichiers.
 - **NE JAMAIS** modifier les liens Markdown [texte](url) ou les images ![alt](path).
+- Les marqueurs de la forme @@C0@@ ou @@U0@@ remplacent du code ou des URL : recopie-les EXACTEMENT, à la même place, sans les traduire ni les supprimer.
 
 ### 3. Ton
 - Le ton doit être professionnel mais conversationnel, reflétant l'humour subtil de l'auteur.
 - Utilise le **vouvoiement** ("vous").
 - La traduction doit être fluide.
 
-### 4. Contexte Précédent
-Voici un résumé des chapitres précédents pour maintenir la cohérence narrative :
-{context_summary}
-
 ## FORMAT DE SORTIE
 Retourne UNIQUEMENT le texte traduit au format Markdown. Ne pas ajouter de commentaires avant ou après.
+
+## CONTEXTE PRÉCÉDENT
+Voici un résumé des chapitres précédents pour maintenir la cohérence narrative :
+{context_summary}
 """
 
+# --- MÉMOIRE DE TRADUCTION ---
+
+class TranslationMemory:
+    """
+    Mémoire de traduction adressée par contenu, stockée dans SQLite.
+    La clé est une empreinte du bloc source, du modèle, de ses options et du prompt système :
+    si l'un d'eux change, la traduction est refaite.
+    La taille totale est bornée par une éviction LRU (colonne last_used).
+    """
+
+    def __init__(self, path: str = TRANSLATION_MEMORY_PATH, max_bytes: int = TRANSLATION_MEMORY_MAX_BYTES):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS memory ("
+            " key TEXT PRIMARY KEY,"
+            " translation TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS memory_last_used ON memory(last_used)")
+        self._conn.commit()
+        self._total_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM memory").fetchone()[0]
+
+    @staticmethod
+    def make_key(chunk: str, model: str, options: Dict[str, Any], system_prompt: str) -> str:
+        """Empreinte SHA-256 de tout ce qui influence la traduction d'un bloc."""
+        payload = json.dumps([chunk, model, options, system_prompt], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Retourne la traduction mémorisée (et la marque comme récemment utilisée), ou None."""
+        with self._lock:
+            row = self._conn.execute("SELECT translation FROM memory WHERE key = ?", (key,)).fetchone()
+            self._local.hit = row is not None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE memory SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, translation: str) -> None:
+        """Mémorise une traduction puis évince les plus anciennes entrées si la taille maximale est dépassée."""
+        size = len(translation.encode('utf-8'))
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM memory WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO memory (key, translation, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, translation, size, time.time())
+            )
+            self._total_size += size - (old[0] if old else 0)
+            if self._total_size > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Supprime les entrées les moins récemment utilisées jusqu'à repasser sous max_bytes."""
+        to_delete = []
+        for key, size in self._conn.execute("SELECT key, size FROM memory ORDER BY last_used"):
+            if self._total_size <= self.max_bytes:
+                break
+            to_delete.append((key,))
+            self._total_size -= size
+        self._conn.executemany("DELETE FROM memory WHERE key = ?", to_delete)
+
+    @property
+    def last_hit(self) -> bool:
+        """Indique si le dernier get() du thread courant a trouvé une traduction."""
+        return getattr(self._local, "hit", False)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+# --- JOURNAL DE REPRISE ---
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class ChunkJournal:
+    """
+    Journal (write-ahead) des blocs déjà traduits d'un fichier, une ligne JSON par bloc terminé.
+    Après un crash ou un Ctrl-C, une relance reprend les blocs non terminés au lieu de tout refaire.
+    Un bloc n'est repris que si son index ET le hash de son texte source correspondent.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._done: Dict[int, Tuple[str, str]] = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self._done[entry["index"]] = (entry["source"], entry["translation"])
+                    except (ValueError, KeyError):
+                        # Dernière ligne tronquée par un arrêt brutal : ignorée
+                        continue
+
+    def __len__(self) -> int:
+        return len(self._done)
+
+    def get(self, index: int, chunk: str) -> Optional[str]:
+        """Traduction journalisée du bloc, si elle correspond toujours au texte source."""
+        entry = self._done.get(index)
+        if entry and entry[0] == text_hash(chunk):
+            return entry[1]
+        return None
+
+    def append(self, index: int, chunk: str, translation: str) -> None:
+        """Ajoute un bloc terminé au journal et force l'écriture sur disque."""
+        line = json.dumps({"index": index, "source": text_hash(chunk), "translation": translation}, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._done[index] = (text_hash(chunk), translation)
+
+    def discard(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class TranslationManifest:
+    """
+    Manifeste du dernier run complet d'un fichier : hash du fichier source et, pour chaque bloc,
+    son texte source, son hash et sa traduction.
+    Après un re-scraping, seuls les blocs absents du manifeste (modifiés ou nouveaux) sont retraduits.
+    """
+
+    def __init__(self, path: str, load: bool = True):
+        self.path = path
+        self.source_hash: Optional[str] = None
+        self.chunks: List[Dict[str, str]] = []
+        if load and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.source_hash = data.get("source_hash")
+                self.chunks = data.get("chunks", [])
+            except (OSError, ValueError):
+                print(f"  [ATTENTION] Manifeste illisible, ignoré : {path}")
+        self._by_hash = {entry["source"]: entry["translation"] for entry in self.chunks}
+
+    def exists(self) -> bool:
+        return self.source_hash is not None
+
+    def is_up_to_date(self, content: str) -> bool:
+        return self.source_hash == text_hash(content)
+
+    def get(self, chunk: str) -> Optional[str]:
+        """Traduction d'un bloc source identique lors du dernier run, s'il y en a une."""
+        return self._by_hash.get(text_hash(chunk))
+
+    def save(self, content: str, chunks: List[str], translations: List[str]) -> None:
+        self.source_hash = text_hash(content)
+        self.chunks = [{"source": text_hash(chunk), "text": chunk, "translation": trans}
+                       for chunk, trans in zip(chunks, translations)]
+        self._write()
+
+    def requeue(self, sources: Set[str]) -> None:
+        """Retire des blocs (par hash source) : ils seront retraduits au prochain passage sur le fichier."""
+        self.chunks = [entry for entry in self.chunks if entry["source"] not in sources]
+        # Hash vide : différent de celui de la source, le fichier repasse en mise à jour incrémentale
+        self.source_hash = ""
+        self._write()
+
+    def _write(self) -> None:
+        self._by_hash = {entry["source"]: entry["translation"] for entry in self.chunks}
+        write_file_atomic(self.path, json.dumps({"source_hash": self.source_hash, "chunks": self.chunks},
+                                                ensure_ascii=False, indent=1))
+
+def write_file_atomic(path: str, content: str) -> None:
+    """Écrit le fichier final via un fichier temporaire + rename : jamais de fichier à moitié écrit."""
+    tmp_path = f"{path}.tmp"
+    with gpp_metrics.span("disk.write"):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+# --- RÉPARTITION SUR PLUSIEURS INSTANCES OLLAMA ---
+
+class OllamaDispatcher:
+    """
+    Répartit des tâches sur plusieurs instances Ollama.
+    Chaque instance expose `concurrency` emplacements : une tâche attend qu'un emplacement se libère,
+    ce qui limite le nombre de requêtes simultanées par instance.
+    """
+
+    def __init__(self, endpoints: List[Dict[str, Any]]):
+        self.endpoints = endpoints
+        self.clients = [ollama.Client(host=ep["host"]) for ep in endpoints]
+        self.capacity = sum(ep["concurrency"] for ep in endpoints)
+        self._slots: "queue.Queue[Tuple[ollama.Client, str]]" = queue.Queue()
+        for client, ep in zip(self.clients, endpoints):
+            for _ in range(ep["concurrency"]):
+                self._slots.put((client, ep["host"]))
+
+    @contextmanager
+    def acquire(self) -> Iterator[Tuple[ollama.Client, str]]:
+        """Réserve un emplacement libre (bloquant) et retourne (client, hôte)."""
+        slot = self._slots.get()
+        try:
+            yield slot
+        finally:
+            self._slots.put(slot)
+
+    def map(self, func: Callable[[Any, ollama.Client, str], Any], items: Iterable[Any]) -> List[Any]:
+        """
+        Applique func(item, client, hôte) à chaque élément en parallèle et retourne les résultats
+        dans l'ordre d'origine. Au plus 2 x capacity tâches sont en vol : au-delà, la production
+        d'éléments est suspendue (backpressure).
+        """
+        in_flight = threading.BoundedSemaphore(2 * self.capacity)
+
+        def run(item: Any) -> Any:
+            try:
+                with self.acquire() as (client, host):
+                    return func(item, client, host)
+            finally:
+                in_flight.release()
+
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.capacity) as executor:
+            for item in items:
+                in_flight.acquire()
+                futures.append(executor.submit(run, item))
+            return [future.result() for future in futures]
+
+def parse_endpoint(spec: str) -> Dict[str, Any]:
+    """Analyse 'hôte[=concurrence]' (ex: http://gpu1:11434=2)."""
+    host, _, concurrency = spec.rpartition("=") if "=" in spec else (spec, "", "1")
+    return {"host": host, "concurrency": max(1, int(concurrency))}
+
 # --- FONCTIONS UTILITAIRES ---
 
-def setup_model():
-    """Vérifie si le modèle est disponible, sinon tente de le télécharger."""
+def create_dispatcher(specs: Optional[List[str]] = None) -> OllamaDispatcher:
+    """Crée le répartiteur pour les instances données ("hôte=N", OLLAMA_ENDPOINTS par défaut) et vérifie le modèle sur chacune."""
+    endpoints = [parse_endpoint(spec) for spec in specs] if specs else OLLAMA_ENDPOINTS
+    dispatcher = OllamaDispatcher(endpoints)
+    for client, ep in zip(dispatcher.clients, endpoints):
+        setup_model(client, ep["host"])
+        if DRAFT_MODEL:
+            setup_model(client, ep["host"], DRAFT_MODEL)
+    if dispatcher.capacity > 1:
+        print(f"[INIT] {len(endpoints)} instance(s) Ollama, {dispatcher.capacity} requêtes simultanées.")
+    return dispatcher
+
+def setup_model(client: Any = ollama, host: str = "Ollama", model: Optional[str] = None):
+    """Vérifie si le modèle (MODEL_NAME par défaut) est disponible sur une instance, sinon tente de le télécharger."""
+    model = model or MODEL_NAME
     try:
-        print(f"[INIT] Vérification du modèle {MODEL_NAME}...")
-        ollama.show(MODEL_NAME)
-        print(f"[INIT] Modèle {MODEL_NAME} trouvé.")
+        print(f"[INIT] Vérification du modèle {model} sur {host}...")
+        client.show(model)
+        print(f"[INIT] Modèle {model} trouvé.")
     except ollama.ResponseError:
-        print(f"[INIT] Modèle {MODEL_NAME} non trouvé. Tentative de téléchargement (cela peut prendre du temps)...")
+        print(f"[INIT] Modèle {model} non trouvé. Tentative de téléchargement (cela peut prendre du temps)...")
         try:
-            ollama.pull(MODEL_NAME)
-            print(f"[INIT] Modèle {MODEL_NAME} téléchargé avec succès.")
+            client.pull(model)
+            print(f"[INIT] Modèle {model} téléchargé avec succès.")
         except Exception as e:
             print(f"[ERREUR] Impossible de télécharger le modèle : {e}")
             exit(1)
 
 def build_system_prompt(context_summary: str) -> str:
-    """Construit le prompt système dynamique avec le glossaire et le contexte."""
+    """
+    Construit le prompt système dynamique avec le glossaire et le contexte.
+    Le prompt est identique octet pour octet pour tous les blocs d'un fichier, et seule sa fin (le contexte)
+    varie d'un fichier à l'autre : Ollama réutilise alors le préfixe déjà évalué (cache KV) et n'évalue
+    que les nouveaux tokens de chaque bloc.
+    """
     dnt_list = ", ".join(GLOSSARY["do_not_translate"])
     trans_list = "\n  ".join([f"- {k} -> {v}" for k, v in GLOSSARY["translations"].items()])
     
@@ -108,61 +434,718 @@ def build_system_prompt(context_summary: str) -> str:
         context_summary=context_summary if context_summary else "Aucun contexte précédent."
     )
 
-def chunk_markdown(content: str, max_chunk_size: int = 2500) -> List[str]:
+# --- DÉCOUPAGE DU MARKDOWN ---
+
+FENCE_RE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+HEADING_RE = re.compile(r'^ {0,3}#{1,6}(\s|$)')
+SECTION_HEADING_RE = re.compile(r'^ {0,3}#{1,2}(\s|$)')
+LIST_ITEM_RE = re.compile(r'^ {0,3}([*+-]|\d{1,9}[.)])(\s|$)')
+TABLE_RE = re.compile(r'^ {0,3}\|')
+SENTENCE_END_RE = re.compile(r'(?<=[.!?:;])\s+')
+
+def is_indented(line: str) -> bool:
+    return line.startswith('    ') or line.startswith('\t')
+
+def parse_markdown_blocks(content: str) -> List[Tuple[str, str]]:
     """
-    Découpe le markdown en morceaux gérables tout en préservant l'intégrité des blocs de code.
-    Evite de couper au milieu d'une phrase.
+    Découpe le markdown en blocs (type, texte) : heading, paragraph, list, table, code.
+    Les blocs de code clôturés (``` ou ~~~) et indentés sont conservés d'un seul tenant.
+    Le texte de chaque bloc est repris tel quel (sans les lignes vides qui les séparent).
     """
-    chunks = []
     lines = content.split('\n')
-    current_chunk = []
-    current_size = 0
-    in_code_block = False
-    
-    for line in lines:
-        # Détection basique de bloc de code
-        if line.strip().startswith('```'):
-            in_code_block = not in_code_block
-        
-        line_len = len(line) + 1 # +1 pour le saut de ligne
-        
-        # Si on dépasse la taille max et qu'on n'est pas dans un bloc de code
-        if current_size + line_len > max_chunk_size and not in_code_block:
-            # On essaie de couper à un endroit propice (fin de paragraphe, ou au moins pas en plein milieu d'un truc bizarre)
-            # Ici on coupe simplement à la ligne si ce n'est pas du code.
-            chunks.append('\n'.join(current_chunk))
-            current_chunk = [line]
-            current_size = line_len
+    blocks = []
+    i = 0
+    n = len(lines)
+
+    while i < n:
+        line = lines[i]
+        if not line.strip():
+            i += 1
+            continue
+
+        # Bloc de code clôturé : la clôture utilise le même caractère, au moins aussi long
+        fence = FENCE_RE.match(line)
+        if fence:
+            marker = fence.group(1)
+            j = i + 1
+            while j < n:
+                closing = lines[j].strip()
+                if closing.startswith(marker) and closing == closing[0] * len(closing):
+                    break
+                j += 1
+            blocks.append(("code", '\n'.join(lines[i:j+1])))
+            i = j + 1
+            continue
+
+        if HEADING_RE.match(line):
+            blocks.append(("heading", line))
+            i += 1
+            continue
+
+        # Bloc indenté : suite d'une liste si on est dans une liste, sinon bloc de code
+        if is_indented(line) and not (blocks and blocks[-1][0] == "list"):
+            j = i
+            while j < n and (is_indented(lines[j]) or not lines[j].strip()):
+                j += 1
+            while j > i and not lines[j-1].strip():
+                j -= 1
+            blocks.append(("code", '\n'.join(lines[i:j])))
+            i = j
+            continue
+
+        if is_indented(line) or LIST_ITEM_RE.match(line):
+            kind = "list"
+        elif TABLE_RE.match(line):
+            kind = "table"
         else:
-            current_chunk.append(line)
-            current_size += line_len
-            
-    if current_chunk:
-        chunks.append('\n'.join(current_chunk))
-        
+            kind = "paragraph"
+
+        j = i
+        while True:
+            while j < n and lines[j].strip() and not FENCE_RE.match(lines[j]) and not HEADING_RE.match(lines[j]):
+                j += 1
+            if kind != "list":
+                break
+            # Liste "aérée" : une ligne vide suivie d'un nouvel item ou d'une ligne indentée continue la liste
+            k = j
+            while k < n and not lines[k].strip():
+                k += 1
+            if k > j and k < n and (LIST_ITEM_RE.match(lines[k]) or is_indented(lines[k])):
+                j = k
+                continue
+            break
+
+        text = '\n'.join(lines[i:j])
+        if kind == "list" and blocks and blocks[-1][0] == "list" and is_indented(line):
+            # Contenu indenté rattaché à l'item précédent (séparé par une ligne vide)
+            blocks[-1] = ("list", blocks[-1][1] + '\n\n' + text)
+        else:
+            blocks.append((kind, text))
+        i = max(j, i + 1)
+
+    return blocks
+
+def estimate_tokens(text: str) -> int:
+    """Estimation rapide du nombre de tokens (pas de tokenizer local) : ~CHARS_PER_TOKEN caractères par token."""
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+def chunk_token_budget(system_prompt: str) -> int:
+    """
+    Taille maximale (en tokens) d'un bloc source pour que prompt système + bloc + traduction
+    tiennent dans MODEL_OPTIONS["num_ctx"].
+    """
+    available = MODEL_OPTIONS["num_ctx"] - estimate_tokens(system_prompt) - CONTEXT_SAFETY_MARGIN
+    budget = int(available / (1 + OUTPUT_TOKEN_RATIO))
+    return max(MIN_CHUNK_TOKENS, min(MAX_CHUNK_TOKENS, budget))
+
+def split_oversized_block(kind: str, text: str, max_tokens: int) -> List[Tuple[str, str]]:
+    """
+    Redécoupe un bloc plus grand que le budget.
+    - code : jamais coupé ; il formera un bloc à lui seul, qui n'est pas envoyé au modèle.
+    - liste / tableau : coupé entre les lignes.
+    - paragraphe : coupé entre les phrases.
+    """
+    if kind == "code" or estimate_tokens(text) <= max_tokens:
+        return [(kind, text)]
+
+    if kind == "paragraph":
+        pieces, separator = SENTENCE_END_RE.split(text), " "
+    else:
+        pieces, separator = text.split('\n'), '\n'
+
+    parts = []
+    current = []
+    for piece in pieces:
+        candidate = separator.join(current + [piece])
+        if current and estimate_tokens(candidate) > max_tokens:
+            parts.append((kind, separator.join(current)))
+            current = [piece]
+        else:
+            current.append(piece)
+    if current:
+        parts.append((kind, separator.join(current)))
+    return parts
+
+def chunk_markdown(content: str, max_tokens: Optional[int] = None) -> List[str]:
+    """
+    Découpe le markdown en morceaux dont la taille estimée en tokens ne dépasse pas max_tokens.
+    Les coupures tombent toujours entre deux blocs (titre, paragraphe, liste, tableau, code) ;
+    un titre n'est jamais laissé seul en fin de morceau.
+    Chaque titre de niveau 1 ou 2 ouvre un nouveau morceau : une modification de la source ne décale
+    ainsi les coupures qu'à l'intérieur de sa section (retraduction incrémentale, cf. TranslationManifest).
+    """
+    if max_tokens is None:
+        max_tokens = chunk_token_budget(build_system_prompt(""))
+
+    blocks = []
+    for kind, text in parse_markdown_blocks(content):
+        blocks.extend(split_oversized_block(kind, text, max_tokens))
+
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    for kind, text in blocks:
+        # +1 pour le séparateur de paragraphe
+        tokens = estimate_tokens(text) + 1
+        if current and kind == "heading" and SECTION_HEADING_RE.match(text):
+            chunks.append('\n\n'.join(t for _, t in current))
+            current = []
+            current_tokens = 0
+        elif current and current_tokens + tokens > max_tokens:
+            carry = []
+            last_kind, last_text = current[-1]
+            if last_kind == "heading" and len(current) > 1 and estimate_tokens(last_text) + tokens <= max_tokens:
+                carry = [current.pop()]
+            chunks.append('\n\n'.join(t for _, t in current))
+            current = carry
+            current_tokens = sum(estimate_tokens(t) + 1 for _, t in current)
+        current.append((kind, text))
+        current_tokens += tokens
+
+    if current:
+        chunks.append('\n\n'.join(t for _, t in current))
+
     return chunks
 
-def translate_chunk(chunk: str, system_prompt: str, retries: int = 3) -> str:
-    """Traduit un morceau de texte avec gestion d'erreurs."""
+# --- MASQUAGE DU CODE ET DES URL ---
+
+# Marqueurs courts envoyés au modèle à la place du code et des URL : @@C0@@ (code), @@U0@@ (URL)
+PLACEHOLDER_RE = re.compile(r'@@\s*([CU]\d+)\s*@@')
+INLINE_CODE_RE = re.compile(r'(`+)(?!`)([\s\S]*?[^`])\1(?!`)')
+LINK_TARGET_RE = re.compile(r'(!?\[[^\]]*\])\(((?:[^()\s]|\([^()\s]*\))+(?:\s+"[^"]*")?)\)')
+AUTOLINK_RE = re.compile(r'<(?:https?|mailto):[^>\s]+>')
+
+def mask_markdown(text: str, start: int = 0) -> Tuple[str, Dict[str, str]]:
+    """
+    Remplace les blocs de code, le code inline, les cibles de liens/images et les autoliens
+    par des marqueurs courts, numérotés à partir de `start`. Retourne (texte masqué, {marqueur: texte d'origine}).
+    """
+    if PLACEHOLDER_RE.search(text):
+        # Le texte contient déjà quelque chose qui ressemble à un marqueur : on ne masque rien
+        return text, {}
+
+    placeholders: Dict[str, str] = {}
+
+    def keep(kind: str, value: str) -> str:
+        marker = f"@@{kind}{start + len(placeholders)}@@"
+        placeholders[marker] = value
+        return marker
+
+    # 1. Blocs de code entiers (clôturés ou indentés), remplacés dans l'ordre d'apparition
+    parts = []
+    cursor = 0
+    for kind, block in parse_markdown_blocks(text):
+        if kind != "code":
+            continue
+        pos = text.find(block, cursor)
+        if pos < 0:
+            continue
+        parts.append(text[cursor:pos])
+        parts.append(keep("C", block))
+        cursor = pos + len(block)
+    parts.append(text[cursor:])
+    text = "".join(parts)
+
+    # 2. Code inline, puis URL des liens et images (le texte des liens reste traduisible)
+    text = INLINE_CODE_RE.sub(lambda m: keep("C", m.group(0)), text)
+    text = LINK_TARGET_RE.sub(lambda m: f"{m.group(1)}({keep('U', m.group(2))})", text)
+    text = AUTOLINK_RE.sub(lambda m: keep("U", m.group(0)), text)
+    return text, placeholders
+
+def unmask_markdown(text: str, placeholders: Dict[str, str]) -> Optional[str]:
+    """
+    Restaure les marqueurs. Retourne None si un marqueur a été perdu, dupliqué ou inventé par le modèle.
+    """
+    found = [f"@@{key}@@" for key in PLACEHOLDER_RE.findall(text)]
+    if sorted(found) != sorted(placeholders):
+        return None
+    return PLACEHOLDER_RE.sub(lambda m: placeholders[f"@@{m.group(1)}@@"], text)
+
+def has_translatable_text(masked: str) -> bool:
+    """Vrai s'il reste du texte à traduire une fois le code et les URL masqués."""
+    return bool(re.search(r'[A-Za-z]', PLACEHOLDER_RE.sub('', masked)))
+
+# --- CONTRÔLE DU GLOSSAIRE ---
+
+class TermMatcher:
+    """
+    Automate d'Aho-Corasick : trouve toutes les occurrences d'un ensemble de termes en un seul passage
+    sur le texte, quel que soit le nombre de termes. La recherche ignore la casse ; une occurrence collée
+    à une lettre ou un chiffre ne compte pas (sauf un « s » final de pluriel).
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        self.terms = sorted({term.lower() for term in terms})
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        for index, term in enumerate(self.terms):
+            state = 0
+            for char in term:
+                nxt = self._goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][char] = nxt
+                state = nxt
+            self._out[state].append(index)
+
+        # Liens d'échec (parcours en largeur) : plus long suffixe du préfixe courant qui soit aussi un préfixe
+        pending = deque(self._goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, nxt in self._goto[state].items():
+                pending.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> Iterator[Tuple[int, int, str]]:
+        """Occurrences (début, fin, terme en minuscules), chevauchements compris."""
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # Rare : un caractère dont la minuscule change de longueur décalerait les positions
+            lowered = "".join(c.lower() if len(c.lower()) == 1 else c for c in text)
+        goto, fail, out, terms = self._goto, self._fail, self._out, self.terms
+        size = len(lowered)
+        state = 0
+        for pos, char in enumerate(lowered):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in out[state]:
+                term = terms[index]
+                start, end = pos + 1 - len(term), pos + 1
+                if start > 0 and lowered[start - 1].isalnum():
+                    continue
+                if end < size and lowered[end] == "s":
+                    end += 1
+                if end < size and lowered[end].isalnum():
+                    continue
+                yield start, end, term
+
+class GlossaryChecker:
+    """
+    Vérifie qu'une traduction respecte GLOSSARY : un terme « à ne pas traduire » présent dans la source doit
+    se retrouver dans la traduction, et un terme à traduction imposée doit y apparaître sous sa forme française.
+    Tous les termes (des deux côtés) sont compilés dans un seul TermMatcher ; le code et les URL sont ignorés.
+    Dans la source, les termes de glossary["case_sensitive"] ne comptent qu'avec leur majuscule.
+    """
+
+    def __init__(self, glossary: Dict[str, Any] = GLOSSARY):
+        self.keep = {term.lower(): term for term in glossary["do_not_translate"]}
+        self.case_sensitive = {term.lower() for term in glossary.get("case_sensitive", [])}
+        self.translations = {src.lower(): dst.lower() for src, dst in glossary["translations"].items()}
+        self.matcher = TermMatcher(list(self.keep) + list(self.translations) + list(self.translations.values()))
+
+    def terms_in(self, text: str, source: bool = False) -> Set[str]:
+        masked = mask_markdown(text)[0]
+        found = set()
+        for start, _, term in self.matcher.find(masked):
+            if source and term in self.case_sensitive and not masked[start].isupper():
+                continue
+            found.add(term)
+        return found
+
+    def check(self, source: str, target: str) -> List[str]:
+        """Liste des violations du glossaire (vide si la traduction est conforme)."""
+        in_source = self.terms_in(source, source=True)
+        if not in_source:
+            return []
+        in_target = self.terms_in(target)
+        violations = []
+        for term in sorted(in_source):
+            if term in self.keep and term not in in_target:
+                violations.append(f"« {self.keep[term]} » traduit (à garder en anglais)")
+            elif term in self.translations and self.translations[term] not in in_target:
+                violations.append(f"« {term} » : « {self.translations[term]} » attendu")
+        return violations
+
+GLOSSARY_CHECKER = GlossaryChecker()
+# Une traduction qui viole le glossaire est retentée (et n'est pas reprise de la mémoire de traduction)
+ENFORCE_GLOSSARY = True
+
+class RunawayGenerationError(Exception):
+    """La génération a dépassé le budget de longueur (modèle qui boucle)."""
+
+def generate_translation(client: Any, prompt: str, system_prompt: str, stream: bool = False,
+                         partial_path: Optional[str] = None,
+                         metrics: Optional[Dict[str, float]] = None, model: Optional[str] = None) -> str:
+    """
+    Appelle le modèle (MODEL_NAME par défaut) et retourne le texte généré.
+    num_predict borne la génération côté serveur (une sortie coupée par cette limite est rejetée). En mode stream, les tokens sont consommés au fil de l'eau,
+    écrits dans partial_path (suivi avec `tail -f`) et la génération est interrompue dès que la sortie
+    dépasse MAX_OUTPUT_RATIO x l'entrée. `metrics` reçoit le TTFT, les tokens/s et les compteurs d'Ollama.
+    """
+    model = model or MODEL_NAME
+    max_chars = int(len(prompt) * MAX_OUTPUT_RATIO) + OUTPUT_SLACK_CHARS
+    options = dict(MODEL_OPTIONS, num_predict=estimate_tokens(prompt) * int(MAX_OUTPUT_RATIO) + 64)
+    t_start = time.time()
+
+    if not stream:
+        with gpp_metrics.span("llm.request"):
+            response = client.generate(model=model, prompt=prompt, system=system_prompt,
+                                       options=options, stream=False, keep_alive=KEEP_ALIVE)
+        final = response
+        text = response['response']
+    else:
+        parts = []
+        size = 0
+        final = None
+        partial = open(partial_path, 'w', encoding='utf-8') if partial_path else None
+        generator = client.generate(model=model, prompt=prompt, system=system_prompt,
+                                    options=options, stream=True, keep_alive=KEEP_ALIVE)
+        try:
+            for piece in generator:
+                token = piece['response']
+                if token and metrics is not None and "ttft" not in metrics:
+                    metrics["ttft"] = time.time() - t_start
+                parts.append(token)
+                size += len(token)
+                if partial:
+                    partial.write(token)
+                    partial.flush()
+                if size > max_chars:
+                    raise RunawayGenerationError(f"génération interrompue après {size} caractères (entrée : {len(prompt)})")
+                if piece.get('done'):
+                    final = piece
+        finally:
+            # Fermer le flux HTTP annule la génération côté serveur
+            generator.close()
+            if partial:
+                partial.close()
+            gpp_metrics.record("llm.request", time.time() - t_start)
+        text = "".join(parts)
+
+    if len(text) > max_chars:
+        raise RunawayGenerationError(f"sortie de {len(text)} caractères pour une entrée de {len(prompt)}")
+    if final is not None and final.get('done_reason') == 'length':
+        # Coupée par num_predict avant la limite en caractères : texte tronqué, à ne pas accepter
+        raise RunawayGenerationError(f"génération coupée par num_predict ({len(text)} caractères, entrée : {len(prompt)})")
+
+    if final is not None:
+        # Répartition du temps côté serveur : évaluation du prompt contre génération
+        gpp_metrics.record("llm.prompt_eval", (final.get('prompt_eval_duration') or 0) / 1e9)
+        gpp_metrics.record("llm.generate", (final.get('eval_duration') or 0) / 1e9)
+        gpp_metrics.count("tokens.in", final.get('prompt_eval_count') or 0)
+        gpp_metrics.count("tokens.out", final.get('eval_count') or 0)
+
+    if metrics is not None and final is not None:
+        eval_count = final.get('eval_count') or 0
+        eval_duration = (final.get('eval_duration') or 0) / 1e9
+        metrics["eval_count"] = eval_count
+        metrics["prompt_eval_count"] = final.get('prompt_eval_count') or 0
+        metrics["prompt_eval_duration"] = (final.get('prompt_eval_duration') or 0) / 1e9
+        metrics["tokens_per_s"] = eval_count / eval_duration if eval_duration else 0.0
+    return text
+
+def translation_models() -> str:
+    """Modèle(s) qui produisent les traductions : la mémoire ne mélange pas les runs avec et sans cascade."""
+    return f"{DRAFT_MODEL}>{MODEL_NAME}" if DRAFT_MODEL else MODEL_NAME
+
+def markdown_outline(text: str) -> List[str]:
+    """Squelette d'un bloc : suite des titres (niveau), listes, tableaux et blocs de code, sans les paragraphes."""
+    outline = []
+    for kind, block in parse_markdown_blocks(text):
+        if kind == "heading":
+            outline.append("#" * (len(block.strip()) - len(block.strip().lstrip("#"))))
+        elif kind != "paragraph":
+            outline.append(kind)
+    return outline
+
+def validate_draft(chunk: str, translation: str) -> List[str]:
+    """
+    Contrôles rapides d'une traduction du modèle de brouillon (DRAFT_MODEL), sans appel au modèle :
+    structure markdown identique, glossaire respecté, longueur plausible. Liste vide = brouillon accepté.
+    """
+    problems = []
+    if markdown_outline(chunk) != markdown_outline(translation):
+        problems.append("structure markdown modifiée")
+    source_size = len(mask_markdown(chunk)[0])
+    ratio = len(mask_markdown(translation)[0]) / max(1, source_size)
+    if not DRAFT_LENGTH_RATIO[0] <= ratio <= DRAFT_LENGTH_RATIO[1]:
+        problems.append(f"longueur x{ratio:.2f}")
+    if ENFORCE_GLOSSARY:
+        problems.extend(GLOSSARY_CHECKER.check(chunk, translation))
+    return problems
+
+def try_draft(chunk: str, masked: str, placeholders: Dict[str, str], system_prompt: str, client: Any = ollama,
+              metrics: Optional[Dict[str, float]] = None) -> Optional[str]:
+    """Une seule tentative avec DRAFT_MODEL ; None si la sortie échoue aux contrôles (le bloc est escaladé)."""
+    translation = None
+    try:
+        with gpp_metrics.span("cascade.draft"):
+            translation = generate_translation(client, masked, system_prompt, metrics=metrics, model=DRAFT_MODEL)
+        translation = unmask_markdown(translation, placeholders) if placeholders else translation
+        problems = ["marqueur de code/URL perdu"] if translation is None else validate_draft(chunk, translation)
+    except Exception as e:
+        problems = [str(e)]
+    return accept_draft(chunk, translation if not problems else None, problems)
+
+def accept_draft(chunk: str, translation: Optional[str], problems: List[str]) -> Optional[str]:
+    """Comptabilise le verdict sur un brouillon (accepté ou escaladé vers MODEL_NAME)."""
+    if problems:
+        gpp_metrics.count("cascade.escalated")
+        print(f"  [CASCADE] Bloc escaladé vers {MODEL_NAME} : {', '.join(problems)}\n", end="", flush=True)
+        return None
+    gpp_metrics.count("cascade.accepted")
+    gpp_metrics.count("cascade.accepted_tokens", estimate_tokens(chunk))
+    return translation
+
+def cascade_report() -> Optional[str]:
+    """
+    Bilan de la cascade, ajouté au rapport de mesures : taux d'escalade et temps gagné, estimé en comptant
+    pour chaque brouillon accepté le temps par token mesuré sur MODEL_NAME, moins le temps passé en brouillons.
+    Sans bloc escaladé dans ce run, le temps par token vient des débits enregistrés pour MODEL_NAME (--plan).
+    """
+    data = gpp_metrics.summary()
+    counters, spans = data["counters"], data["spans"]
+    accepted, escalated = counters.get("cascade.accepted", 0), counters.get("cascade.escalated", 0)
+    if not accepted + escalated:
+        return None
+    rate = escalated / (accepted + escalated)
+    gpp_metrics.gauge("cascade.escalation_rate", round(rate, 4))
+    line = f"{accepted:.0f} blocs acceptés de {DRAFT_MODEL}, {escalated:.0f} escaladés vers {MODEL_NAME} ({rate:.0%})"
+    main_tokens = counters.get("cascade.main_tokens", 0)
+    main_time = spans.get("cascade.main", {}).get("total_s", 0.0)
+    accepted_tokens = counters.get("cascade.accepted_tokens", 0)
+    if main_tokens and main_time:
+        main_cost = accepted_tokens * main_time / main_tokens
+        source = "d'après les blocs escaladés"
+    else:
+        throughput, measured = load_throughput(MODEL_NAME)
+        main_cost = (accepted * throughput["overhead_s"] + accepted_tokens / throughput["prompt_tps"]
+                     + accepted_tokens * OUTPUT_TOKEN_RATIO / throughput["output_tps"])
+        source = f"débits {'enregistrés' if measured else 'par défaut'} de {MODEL_NAME}"
+    saved = main_cost - spans.get("cascade.draft", {}).get("total_s", 0.0)
+    gpp_metrics.gauge("cascade.saved_s", round(saved, 3))
+    return line + f", temps gagné estimé : {saved:.1f}s ({source})"
+
+def lookup_memory(chunk: str, system_prompt: str,
+                  memory: Optional[TranslationMemory]) -> Tuple[Optional[str], Optional[str]]:
+    """Retourne (clé, traduction mémorisée ou None) pour un bloc ; (None, None) sans mémoire."""
+    if memory is None:
+        return None, None
+    memory_key = memory.make_key(chunk, translation_models(), MODEL_OPTIONS, system_prompt)
+    cached = memory.get(memory_key)
+    if cached is not None and ENFORCE_GLOSSARY and GLOSSARY_CHECKER.check(chunk, cached):
+        # Traduction mémorisée avant le contrôle du glossaire (ou remise en file) : on la refait
+        gpp_metrics.count("glossary.memory_rejected")
+        cached = None
+    if cached is not None:
+        gpp_metrics.count("memory.hit")
+    return memory_key, cached
+
+def try_translate_chunk(chunk: str, system_prompt: str, retries: int = 3,
+                        memory: Optional[TranslationMemory] = None, client: Any = ollama,
+                        stream: bool = False, partial_path: Optional[str] = None,
+                        metrics: Optional[Dict[str, float]] = None) -> Optional[str]:
+    """
+    Traduit un morceau de texte avec gestion d'erreurs (et mémoire de traduction si fournie).
+    `client` permet de cibler une instance Ollama précise (module ollama = instance par défaut).
+    Retourne None si toutes les tentatives ont échoué.
+    """
     if not chunk.strip():
         return chunk
-        
+
+    # Le code et les URL ne passent pas par le modèle : ils sont restaurés après traduction
+    masked, placeholders = mask_markdown(chunk)
+    if not has_translatable_text(masked):
+        return chunk
+
+    memory_key, cached = lookup_memory(chunk, system_prompt, memory)
+    if cached is not None:
+        return cached
+    return translate_with_retries(chunk, masked, placeholders, system_prompt, retries, memory, memory_key,
+                                  client, stream, partial_path, metrics)
+
+def translate_with_retries(chunk: str, masked: str, placeholders: Dict[str, str], system_prompt: str,
+                           retries: int, memory: Optional[TranslationMemory], memory_key: Optional[str],
+                           client: Any = ollama, stream: bool = False, partial_path: Optional[str] = None,
+                           metrics: Optional[Dict[str, float]] = None, draft: bool = True) -> Optional[str]:
+    """
+    Envoie un bloc (déjà masqué) au modèle jusqu'à obtenir une traduction valide ; None après `retries` échecs.
+    En mode cascade (et si draft), le modèle de brouillon est essayé une fois avant MODEL_NAME.
+    """
+    if draft and DRAFT_MODEL:
+        translation = try_draft(chunk, masked, placeholders, system_prompt, client, metrics)
+        if translation is not None:
+            if memory is not None:
+                memory.put(memory_key, translation)
+            return translation
+
+    lost_markers = 0
+    off_glossary = None  # Meilleure traduction disponible si le glossaire n'est jamais respecté
     for attempt in range(retries):
+        if attempt:
+            gpp_metrics.count("llm.retries")
+        # Dernier recours : si le modèle a perdu des marqueurs à chaque essai, on envoie le texte brut
+        use_mask = bool(placeholders) and not (attempt == retries - 1 and 0 < lost_markers == attempt)
         try:
-            response = ollama.generate(
-                model=MODEL_NAME,
-                prompt=chunk,
-                system=system_prompt,
-                options=MODEL_OPTIONS,
-                stream=False
-            )
-            return response['response']
+            with gpp_metrics.span("cascade.main") if DRAFT_MODEL else nullcontext():
+                translation = generate_translation(client, masked if use_mask else chunk, system_prompt,
+                                                   stream=stream, partial_path=partial_path, metrics=metrics)
+            if DRAFT_MODEL:
+                gpp_metrics.count("cascade.main_tokens", estimate_tokens(chunk))
+            if use_mask:
+                translation = unmask_markdown(translation, placeholders)
+                if translation is None:
+                    lost_markers += 1
+                    print(f"  [ERREUR] Tentative {attempt+1}/{retries} : marqueur de code/URL perdu par le modèle")
+                    continue
+            violations = GLOSSARY_CHECKER.check(chunk, translation) if ENFORCE_GLOSSARY else []
+            if violations:
+                gpp_metrics.count("glossary.violations")
+                print(f"  [GLOSSAIRE] Tentative {attempt+1}/{retries} : {', '.join(violations)}")
+                off_glossary = translation
+                continue
+            if memory is not None:
+                memory.put(memory_key, translation)
+            return translation
+        except RunawayGenerationError as e:
+            # Pas d'attente : le serveur va bien, c'est la génération qui a dérapé
+            print(f"  [ERREUR] Tentative {attempt+1}/{retries} échouée : {e}")
         except Exception as e:
             print(f"  [ERREUR] Tentative {attempt+1}/{retries} échouée : {e}")
             time.sleep(2 * (attempt + 1))
+
+    if off_glossary is not None:
+        # Traduction gardée (sans la mémoriser) : --check-glossary --requeue la remettra en file
+        gpp_metrics.count("glossary.accepted")
+        print("  [GLOSSAIRE] Traduction conservée malgré le glossaire non respecté.")
+        return off_glossary
             
     print("  [ECHEC] Impossible de traduire ce bloc après plusieurs tentatives.")
-    return chunk # On retourne l'original en cas d'échec total pour ne pas tout perdre
+    gpp_metrics.count("chunks.failed")
+    return None
+
+# Séparateur de segment dans une requête groupée, seul sur sa ligne : @@S1@@, @@S2@@...
+BATCH_MARKER_RE = re.compile(r'^[ \t]*@@\s*S(\d+)\s*@@[ \t]*$', re.MULTILINE)
+
+# Ajouté au prompt système des seules requêtes groupées : les clés de la mémoire de traduction (calculées
+# avec le prompt système d'un bloc seul) ne changent pas, et le préfixe en cache côté Ollama reste commun.
+BATCH_RULES = """
+## REQUÊTE GROUPÉE
+Le texte contient {count} segments indépendants, chacun précédé d'une ligne séparatrice @@S1@@, @@S2@@... jusqu'à @@S{count}@@.
+- Traduis chaque segment séparément, dans l'ordre.
+- Recopie chaque ligne séparatrice EXACTEMENT, seule sur sa ligne, juste avant la traduction de son segment.
+- Ne fusionne pas les segments, ne supprime et ne traduis aucun séparateur, n'en ajoute aucun.
+- Ta réponse commence directement par @@S1@@.
+"""
+
+def split_batch(text: str, count: int) -> Optional[List[str]]:
+    """Découpe la réponse d'une requête groupée en `count` segments ; None si les séparateurs sont abîmés."""
+    markers = list(BATCH_MARKER_RE.finditer(text))
+    if [int(m.group(1)) for m in markers] != list(range(1, count + 1)) or text[:markers[0].start()].strip():
+        return None
+    ends = [m.start() for m in markers[1:]] + [len(text)]
+    segments = [text[m.end():end].strip() for m, end in zip(markers, ends)]
+    return segments if all(segments) else None
+
+def try_translate_batch(chunks: List[str], system_prompt: str, retries: int = 3,
+                        memory: Optional[TranslationMemory] = None, client: Any = ollama,
+                        metrics: Optional[Dict[str, float]] = None) -> List[Optional[str]]:
+    """
+    Traduit plusieurs petits blocs en une seule requête, séparés par des lignes @@S1@@, @@S2@@...
+    Les marqueurs de code/URL sont numérotés à la suite d'un segment à l'autre pour rester uniques.
+    Un segment invalide (marqueur perdu, glossaire, sortie démesurée) est retraduit seul, et tous le sont
+    si les séparateurs reviennent abîmés. En mode cascade, le lot part au modèle de brouillon et un segment
+    qui échoue aux contrôles de validate_draft() est escaladé directement vers MODEL_NAME.
+    Retourne les traductions dans l'ordre (None = échec).
+    """
+    results: List[Optional[str]] = list(chunks)
+    pending = []  # (indice, masqué, marqueurs, clé mémoire)
+    offset = 0
+    for i, chunk in enumerate(chunks):
+        masked, placeholders = mask_markdown(chunk, offset)
+        if not chunk.strip() or not has_translatable_text(masked):
+            continue
+        memory_key, cached = lookup_memory(chunk, system_prompt, memory)
+        if cached is not None:
+            results[i] = cached
+            continue
+        offset += len(placeholders)
+        pending.append((i, masked, placeholders, memory_key))
+
+    segments = None
+    markers = [marker for _, _, placeholders, _ in pending for marker in placeholders]
+    if len(set(markers)) != len(markers):
+        # Deux segments avec le même marqueur : unmask_markdown() remettrait le mauvais code, pas de lot
+        print(f"  [ATTENTION] Marqueurs en double dans le lot : {len(pending)} blocs traduits un par un\n",
+              end="", flush=True)
+        gpp_metrics.count("batch.marker_collisions")
+    elif len(pending) > 1:
+        prompt = "\n\n".join(f"@@S{n}@@\n{masked}" for n, (_, masked, _, _) in enumerate(pending, 1))
+        gpp_metrics.count("batch.requests")
+        gpp_metrics.count("batch.segments", len(pending))
+        try:
+            with gpp_metrics.span("cascade.draft") if DRAFT_MODEL else nullcontext():
+                text = generate_translation(client, prompt, system_prompt + BATCH_RULES.format(count=len(pending)),
+                                            metrics=metrics, model=DRAFT_MODEL)
+            segments = split_batch(text, len(pending))
+        except Exception as e:
+            print(f"  [ERREUR] Requête groupée échouée : {e}\n", end="", flush=True)
+        if segments is None:
+            gpp_metrics.count("batch.fallbacks")
+            print(f"  [LOT] Séparateurs abîmés : {len(pending)} blocs retraduits un par un\n", end="", flush=True)
+
+    for n, (i, masked, placeholders, memory_key) in enumerate(pending):
+        translation = None
+        if segments is not None:
+            translation = unmask_markdown(segments[n], placeholders)
+            if translation is None:
+                problems = ["marqueur de code/URL perdu"]
+            elif len(translation) > len(chunks[i]) * MAX_OUTPUT_RATIO + OUTPUT_SLACK_CHARS:
+                problems = [f"sortie de {len(translation)} caractères pour une entrée de {len(chunks[i])}"]
+                translation = None
+            else:
+                problems = []
+            if DRAFT_MODEL:
+                problems = problems or validate_draft(chunks[i], translation)
+                translation = accept_draft(chunks[i], translation if not problems else None, problems)
+            elif translation is not None and ENFORCE_GLOSSARY and GLOSSARY_CHECKER.check(chunks[i], translation):
+                translation = None
+            if translation is not None:
+                if memory is not None:
+                    memory.put(memory_key, translation)
+                results[i] = translation
+                continue
+            gpp_metrics.count("batch.segment_fallbacks")
+        # Seul, le bloc reprend une numérotation de marqueurs à partir de 0
+        masked, placeholders = mask_markdown(chunks[i])
+        # Un segment rejeté par la cascade ne repasse pas par le brouillon
+        results[i] = translate_with_retries(chunks[i], masked, placeholders, system_prompt, retries, memory,
+                                            memory_key, client, draft=segments is None)
+    return results
+
+def translate_chunk(chunk: str, system_prompt: str, retries: int = 3,
+                    memory: Optional[TranslationMemory] = None, client: Any = ollama) -> str:
+    """Traduit un morceau de texte ; en cas d'échec total, retourne l'original pour ne pas tout perdre."""
+    with gpp_metrics.span("translate_chunk"):
+        translation = try_translate_chunk(chunk, system_prompt, retries, memory, client)
+    return chunk if translation is None else translation
+
+def report_prompt_evals(prompt_evals: List[Tuple[int, int, float]]) -> None:
+    """
+    Affiche le coût d'évaluation du prompt : premier bloc envoyé (prompt système complet)
+    contre moyenne des suivants (préfixe réutilisé depuis le cache KV d'Ollama).
+    """
+    if not prompt_evals:
+        return
+    prompt_evals = sorted(prompt_evals)
+    _, first_tokens, first_time = prompt_evals[0]
+    line = f"  -> Prompt-eval : 1er bloc {first_tokens} tokens en {first_time:.2f}s"
+    if len(prompt_evals) > 1:
+        others = prompt_evals[1:]
+        avg_tokens = sum(tokens for _, tokens, _ in others) / len(others)
+        avg_time = sum(duration for _, _, duration in others) / len(others)
+        line += f", blocs suivants {avg_tokens:.0f} tokens en {avg_time:.2f}s en moyenne"
+    print(line)
 
 def extract_summary(translated_content: str) -> str:
     """Crée un bref résumé du contenu traduit pour le contexte suivant."""
@@ -171,6 +1154,243 @@ def extract_summary(translated_content: str) -> str:
     clean_text = re.sub(r'```[\s\S]*?```', '', translated_content)
     return clean_text[:500].replace('\n', ' ') + "..."
 
+# --- CONTEXTE ENTRE CHAPITRES ---
+
+class SummaryCache:
+    """
+    Résumés des chapitres traduits (.cache/summaries.json), indexés par chemin relatif et hash du fichier source.
+    Un chapitre sauté (déjà traduit) fournit ainsi son résumé au suivant sans être relu ni retraduit.
+    """
+
+    def __init__(self, path: str = SUMMARY_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, str]] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                print(f"  [ATTENTION] Cache des résumés illisible, ignoré : {path}")
+
+    def get(self, rel_path: str, source_hash: Optional[str] = None) -> Optional[str]:
+        """Résumé enregistré pour ce chapitre (pour cette version de la source si source_hash est donné)."""
+        entry = self._entries.get(rel_path)
+        if entry is None or (source_hash is not None and entry["source_hash"] != source_hash):
+            return None
+        return entry["summary"]
+
+    def put(self, rel_path: str, source_hash: str, summary: str) -> None:
+        with self._lock:
+            if self._entries.get(rel_path) == {"source_hash": source_hash, "summary": summary}:
+                return
+            self._entries[rel_path] = {"source_hash": source_hash, "summary": summary}
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            write_file_atomic(self.path, json.dumps(self._entries, ensure_ascii=False, indent=1, sort_keys=True))
+
+TOC_LINK_RE = re.compile(r'\[([^\]]+)\]\(([^)]+\.md)\)')
+
+def read_toc(root_dir: str) -> List[Tuple[str, str, str]]:
+    """
+    Table des matières écrite par le scraping (book/README.md) : (section, titre, chemin relatif du .md)
+    dans l'ordre du livre. Liste vide si le README n'existe pas.
+    """
+    readme_path = os.path.join(root_dir, "README.md")
+    if not os.path.exists(readme_path):
+        return []
+    toc = []
+    section = ""
+    with open(readme_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.startswith("## "):
+                section = line[3:].strip()
+                continue
+            match = TOC_LINK_RE.search(line)
+            if match:
+                toc.append((section, match.group(1), os.path.normpath(match.group(2))))
+    return toc
+
+def build_chapter_contexts(files: List[str], root_dir: str = OUTPUT_DIR) -> Dict[str, str]:
+    """
+    Contexte de chaque fichier en mode "toc", calculé avant toute traduction : plan du livre, chapitre en cours
+    et début de la source (anglaise) du chapitre précédent. Aucun chapitre n'attend la traduction d'un autre.
+    Le contexte ne dépend que des sources : d'un run à l'autre, le prompt système d'un chapitre (et donc les clés
+    de sa mémoire de traduction) ne change pas selon les résumés déjà en cache.
+    Le plan est identique pour tous les fichiers et vient en premier : le préfixe commun du prompt système
+    reste réutilisable par le cache KV d'Ollama d'un chapitre à l'autre.
+    """
+    toc = read_toc(root_dir)
+    plan_lines: List[str] = []
+    for section, title, _ in toc:
+        if section and (not plan_lines or not plan_lines[-1].startswith(f"- {section} :")):
+            plan_lines.append(f"- {section} : {title}")
+        elif section:
+            plan_lines[-1] += f", {title}"
+        else:
+            plan_lines.append(f"- {title}")
+    plan = "Plan du livre :\n" + "\n".join(plan_lines) if plan_lines else ""
+
+    # Ordre du livre : celui de la table des matières, à défaut celui des fichiers
+    order = [rel for _, _, rel in toc] or [os.path.normpath(os.path.relpath(path, root_dir)) for path in files]
+    titles = {rel: (section, title) for section, title, rel in toc}
+    contexts = {}
+    for file_path in files:
+        rel_path = os.path.normpath(os.path.relpath(file_path, root_dir))
+        section, title = titles.get(rel_path, ("", rel_path))
+        parts = [plan] if plan else []
+        parts.append(f"Chapitre en cours : {f'{section} > ' if section else ''}{title}")
+        position = order.index(rel_path) if rel_path in order else 0
+        if position > 0:
+            previous = order[position - 1]
+            previous_path = os.path.join(root_dir, previous)
+            summary = None
+            if os.path.exists(previous_path):
+                with open(previous_path, 'r', encoding='utf-8') as f:
+                    summary = extract_summary(f.read())
+            if summary:
+                parts.append(f"Chapitre précédent ({titles.get(previous, ('', previous))[1]}) : {summary}")
+        contexts[file_path] = "\n".join(parts)
+    return contexts
+
+# --- ESTIMATION DE LA DURÉE ---
+
+def load_throughput(models: Optional[str] = None) -> Tuple[Dict[str, float], bool]:
+    """
+    Débits mesurés pour `models` (par défaut les modèles courants, translation_models()) ;
+    (DEFAULT_THROUGHPUT, False) sans mesure.
+    """
+    try:
+        with open(THROUGHPUT_PATH, 'r', encoding='utf-8') as f:
+            measured = json.load(f).get(models or translation_models())
+    except (OSError, ValueError):
+        measured = None
+    if not measured:
+        return dict(DEFAULT_THROUGHPUT), False
+    return {key: measured.get(key, value) for key, value in DEFAULT_THROUGHPUT.items()}, True
+
+def save_throughput() -> Optional[Dict[str, float]]:
+    """
+    Enregistre les débits mesurés pendant ce run (tokens évalués/s, tokens générés/s, surcoût par requête),
+    moyennés avec les mesures précédentes. Rien n'est enregistré si aucun bloc n'est passé par le modèle.
+    """
+    data = gpp_metrics.summary()
+    counters, spans = data["counters"], data["spans"]
+    requests = spans.get("llm.request")
+    prompt_eval = spans.get("llm.prompt_eval", {}).get("total_s", 0.0)
+    generate = spans.get("llm.generate", {}).get("total_s", 0.0)
+    if not requests or not generate or not counters.get("tokens.out"):
+        return None
+    run = {
+        "prompt_tps": counters.get("tokens.in", 0) / prompt_eval if prompt_eval else DEFAULT_THROUGHPUT["prompt_tps"],
+        "output_tps": counters["tokens.out"] / generate,
+        "overhead_s": max(0.0, requests["total_s"] - prompt_eval - generate) / requests["count"],
+    }
+    try:
+        with open(THROUGHPUT_PATH, 'r', encoding='utf-8') as f:
+            history = json.load(f)
+    except (OSError, ValueError):
+        history = {}
+    previous = history.get(translation_models())
+    if previous:
+        # Moyenne glissante : un run isolé (machine chargée, très peu de blocs) ne fausse pas tout le plan
+        run = {key: (value + previous.get(key, value)) / 2 for key, value in run.items()}
+    history[translation_models()] = dict({key: round(value, 4) for key, value in run.items()},
+                                         updated=time.strftime("%Y-%m-%d %H:%M:%S"))
+    os.makedirs(os.path.dirname(THROUGHPUT_PATH) or ".", exist_ok=True)
+    write_file_atomic(THROUGHPUT_PATH, json.dumps(history, ensure_ascii=False, indent=1, sort_keys=True))
+    return run
+
+def estimate_file(file_path: str, throughput: Dict[str, float], force: bool = False,
+                  skip_translated: bool = True, batch: bool = True) -> Dict[str, Any]:
+    """
+    Estime le travail restant sur un fichier sans appeler le modèle : blocs à traduire (hors manifeste
+    et journal), tokens d'entrée et de sortie, nombre de requêtes et durée. Les petits blocs sont regroupés
+    comme dans translate_file() si batch est vrai (ni --no-batch ni --stream), sinon un bloc = une requête.
+    Le découpage suppose un contexte vide : la taille des blocs peut légèrement différer au vrai run.
+    """
+    output_path = file_path.replace(".md", "_fr.md")
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    manifest = TranslationManifest(f"{output_path}.manifest.json", load=not force)
+    estimate = {"path": file_path, "chunks": 0, "pending": 0, "tokens_in": 0, "tokens_out": 0,
+                "requests": 0, "seconds": 0.0}
+    if os.path.exists(output_path) and skip_translated and not force:
+        if manifest.is_up_to_date(content) or not manifest.exists():
+            return estimate
+
+    system_tokens = estimate_tokens(build_system_prompt(""))
+    journal = ChunkJournal(f"{output_path}.journal")
+    chunks = chunk_markdown(content)
+    batch_size = batch_tokens = 0
+    estimate["chunks"] = len(chunks)
+    for j, chunk in enumerate(chunks):
+        masked = mask_markdown(chunk)[0]
+        if (not has_translatable_text(masked) or manifest.get(chunk) is not None
+                or (not force and journal.get(j, chunk) is not None)):
+            continue
+        tokens = estimate_tokens(masked)
+        estimate["pending"] += 1
+        estimate["tokens_in"] += tokens
+        estimate["tokens_out"] += int(tokens * OUTPUT_TOKEN_RATIO)
+        if not batch or tokens > BATCH_CHUNK_TOKENS:
+            estimate["requests"] += 1
+            continue
+        if not batch_size or batch_size >= BATCH_MAX_SEGMENTS or batch_tokens + tokens > BATCH_MAX_TOKENS:
+            estimate["requests"] += 1
+            batch_size = batch_tokens = 0
+        batch_size += 1
+        batch_tokens += tokens
+    if estimate["pending"]:
+        # Le prompt système n'est évalué en entier qu'une fois par fichier (cache KV ensuite)
+        estimate["seconds"] = (estimate["requests"] * throughput["overhead_s"]
+                               + (estimate["tokens_in"] + system_tokens) / throughput["prompt_tps"]
+                               + estimate["tokens_out"] / throughput["output_tps"])
+    return estimate
+
+def format_duration(seconds: float) -> str:
+    """42s, 3.5 min, 2h05."""
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds/60:.1f} min"
+    return f"{int(seconds // 3600)}h{int(seconds % 3600 // 60):02d}"
+
+def schedule_makespan(durations: List[float], workers: int) -> float:
+    """Durée totale si les chapitres sont pris dans cet ordre par `workers` traducteurs (premier libre servi)."""
+    finish = [0.0] * max(1, workers)
+    for duration in durations:
+        slot = finish.index(min(finish))
+        finish[slot] += duration
+    return max(finish)
+
+def print_plan(files: List[str], capacity: int, chapters: int, force: bool = False,
+               skip_translated: bool = True, batch: bool = True) -> None:
+    """Affiche l'estimation par chapitre et totale (--plan), et le gain de l'ordre du plus long au plus court."""
+    throughput, measured = load_throughput()
+    source = (f"mesurés lors des runs précédents ({THROUGHPUT_PATH})" if measured
+              else "par défaut (aucun run mesuré)")
+    print(f"[PLAN] Débits {source} : {throughput['output_tps']:.1f} tokens générés/s, "
+          f"{throughput['prompt_tps']:.0f} tokens évalués/s, {throughput['overhead_s']:.2f}s par requête")
+    estimates = [estimate_file(path, throughput, force, skip_translated, batch) for path in files]
+    for estimate in estimates:
+        if not estimate["pending"]:
+            continue
+        print(f"  {os.path.relpath(estimate['path'], OUTPUT_DIR)} : {estimate['pending']}/{estimate['chunks']} blocs, "
+              f"~{estimate['tokens_in']} -> {estimate['tokens_out']} tokens, {estimate['requests']} requêtes, "
+              f"~{format_duration(estimate['seconds'])}")
+    pending = [estimate for estimate in estimates if estimate["pending"]]
+    total = sum(estimate["seconds"] for estimate in pending)
+    print(f"[PLAN] {len(pending)}/{len(files)} fichiers à traduire, "
+          f"{sum(estimate['tokens_out'] for estimate in pending)} tokens à générer : ~{format_duration(total)} en séquentiel")
+    if pending and (chapters > 1 or capacity > 1):
+        # Chaque chapitre dispose d'une part des requêtes simultanées (au plus une par bloc)
+        share = max(1, capacity // max(1, chapters))
+        durations = [estimate["seconds"] / min(share, estimate["requests"] or 1) for estimate in pending]
+        in_order = schedule_makespan(durations, chapters)
+        longest_first = schedule_makespan(sorted(durations, reverse=True), chapters)
+        print(f"[PLAN] {chapters} chapitres x {share} requêtes simultanées : ~{format_duration(in_order)} dans l'ordre "
+              f"du livre, ~{format_duration(longest_first)} du plus long au plus court")
+
 def get_markdown_files(root_dir: str) -> List[str]:
     """Récupère récursivement tous les fichiers .md (sauf README et _fr)."""
     md_files = []
@@ -182,14 +1402,243 @@ def get_markdown_files(root_dir: str) -> List[str]:
     md_files.sort()
     return md_files
 
+def check_glossary_files(root_dir: str, requeue: bool = False) -> int:
+    """
+    Contrôle terminologique de tout le livre : chaque bloc des manifestes (*_fr.md.manifest.json)
+    est comparé à sa source. Avec requeue, les blocs fautifs sont retirés du manifeste pour être
+    retraduits au prochain run. Retourne le nombre de blocs en défaut.
+    """
+    t_start = time.time()
+    files = blocks = flagged = 0
+    for root, dirs, names in os.walk(root_dir):
+        dirs.sort()
+        for name in sorted(names):
+            if not name.endswith("_fr.md.manifest.json"):
+                continue
+            manifest = TranslationManifest(os.path.join(root, name))
+            rel_path = os.path.relpath(manifest.path, root_dir)[:-len(".manifest.json")]
+            chapter_key = os.path.dirname(rel_path).replace(os.sep, '/')
+            files += 1
+            offending: Set[str] = set()
+            for n, entry in enumerate(manifest.chunks):
+                blocks += 1
+                violations = GLOSSARY_CHECKER.check(entry["text"], entry["translation"])
+                if violations:
+                    offending.add(entry["source"])
+                    gpp_metrics.count("glossary.violations", len(violations), chapter_key)
+                    print(f"  [GLOSSAIRE] {rel_path}, bloc {n+1} : {', '.join(violations)}")
+            flagged += len(offending)
+            if offending and requeue:
+                manifest.requeue(offending)
+                print(f"  -> {len(offending)} blocs remis en file pour {rel_path}")
+    gpp_metrics.record("glossary.check", time.time() - t_start)
+    print(f"[GLOSSAIRE] {files} fichiers, {blocks} blocs contrôlés en {time.time()-t_start:.2f}s : "
+          f"{flagged} blocs en défaut{' (remis en file)' if requeue and flagged else ''}")
+    return flagged
+
+def translate_file(file_path: str, dispatcher: OllamaDispatcher, memory: Optional[TranslationMemory],
+                   global_context: str, force: bool = False, stream: bool = False,
+                   skip_translated: bool = True, summaries: Optional[SummaryCache] = None,
+                   batch: bool = True) -> Dict[str, Any]:
+    """
+    Traduit un fichier markdown (manifeste, journal, blocs répartis sur les instances Ollama).
+    Avec batch, les petits blocs sont envoyés par lots (une requête pour plusieurs blocs).
+    Le fichier _fr.md n'est écrit que si tous les blocs sont traduits.
+    Retourne {status: "skipped" | "ok" | "incomplete", output_path, chunks, failures, context},
+    où context est le contexte à transmettre au chapitre suivant (résumé en cache si le fichier a été sauté).
+    """
+    rel_path = os.path.relpath(file_path, OUTPUT_DIR)
+    # Mesures rattachées au dossier du chapitre, comme dans les rapports de scraping et d'EPUB
+    chapter_key = os.path.dirname(rel_path).replace(os.sep, '/')
+
+    output_path = file_path.replace(".md", "_fr.md")
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    # Vérifier si déjà traduit (et si la source a changé depuis)
+    manifest = TranslationManifest(f"{output_path}.manifest.json", load=not force)
+    if os.path.exists(output_path) and skip_translated and not force:
+        if manifest.is_up_to_date(content) or not manifest.exists():
+            print(f"  [SKIP] Fichier déjà traduit : {output_path}")
+            gpp_metrics.count("files.skipped", chapter_name=chapter_key)
+            # Le résumé du chapitre sauté sert de contexte au suivant : la chaîne n'est pas rompue
+            chapter_summary = summaries.get(rel_path, text_hash(content)) if summaries is not None else None
+            if chapter_summary is None:
+                with open(output_path, 'r', encoding='utf-8') as f:
+                    chapter_summary = extract_summary(f.read())
+                if summaries is not None:
+                    summaries.put(rel_path, text_hash(content), chapter_summary)
+            return {"status": "skipped", "output_path": output_path, "chunks": 0, "failures": 0,
+                    "context": f"Dernier chapitre traduit ({rel_path}): {chapter_summary}"}
+        print("  -> Source modifiée depuis la dernière traduction : mise à jour incrémentale.")
+
+    t_file = time.time()
+    system_prompt = build_system_prompt(global_context)
+    max_tokens = chunk_token_budget(system_prompt)
+    chunks = chunk_markdown(content, max_tokens)
+    masked_size = sum(len(mask_markdown(chunk)[0]) for chunk in chunks)
+    saved = 100 * (1 - masked_size / max(1, sum(len(chunk) for chunk in chunks)))
+    print(f"  -> Découpé en {len(chunks)} blocs (max ~{max_tokens} tokens, {saved:.0f}% masqué : code/URL).")
+
+    journal = ChunkJournal(f"{output_path}.journal")
+    if force:
+        journal.discard()
+        journal = ChunkJournal(f"{output_path}.journal")
+    if len(journal):
+        print(f"  -> Reprise : {len(journal)} blocs déjà traduits dans le journal.")
+    unchanged = sum(1 for chunk in chunks if manifest.get(chunk) is not None)
+    if unchanged:
+        print(f"  -> {unchanged} blocs inchangés repris du manifeste, {len(chunks) - unchanged} à traduire.")
+
+    # Tâches : un bloc seul, ou un lot de petits blocs restant à traduire (pas en streaming : un lot
+    # n'a pas de sortie partielle par bloc)
+    jobs: List[List[Tuple[int, str]]] = []
+    pending_batch: List[Tuple[int, str]] = []
+    batch_tokens = 0
+    for j, chunk in enumerate(chunks):
+        tokens = estimate_tokens(mask_markdown(chunk)[0])
+        if (not batch or stream or tokens > BATCH_CHUNK_TOKENS
+                or manifest.get(chunk) is not None or journal.get(j, chunk) is not None):
+            jobs.append([(j, chunk)])
+            continue
+        if pending_batch and (len(pending_batch) >= BATCH_MAX_SEGMENTS or batch_tokens + tokens > BATCH_MAX_TOKENS):
+            jobs.append(pending_batch)
+            pending_batch, batch_tokens = [], 0
+        pending_batch.append((j, chunk))
+        batch_tokens += tokens
+    if pending_batch:
+        jobs.append(pending_batch)
+    batches = sum(1 for job in jobs if len(job) > 1)
+    if batches:
+        print(f"  -> {sum(len(job) for job in jobs if len(job) > 1)} petits blocs regroupés en {batches} requêtes.")
+
+    prompt_evals: List[Tuple[int, int, float]] = []  # (bloc, tokens évalués, durée) pour les blocs envoyés au modèle
+
+    def translate_job(job: List[Tuple[int, str]], client: ollama.Client, host: str) -> List[Optional[str]]:
+        with gpp_metrics.chapter(chapter_key):
+            if len(job) > 1:
+                return translate_batch(job, client, host)
+            return [translate_one(job[0][0], job[0][1], client, host)]
+
+    def translate_batch(job: List[Tuple[int, str]], client: ollama.Client, host: str) -> List[Optional[str]]:
+        gpp_metrics.count("chunks", len(job))
+        t_start = time.time()
+        metrics: Dict[str, float] = {}
+        with gpp_metrics.span("translate_batch"):
+            translations = try_translate_batch([chunk for _, chunk in job], system_prompt, memory=memory,
+                                               client=client, metrics=metrics)
+        if "prompt_eval_count" in metrics:
+            prompt_evals.append((job[0][0], metrics["prompt_eval_count"], metrics["prompt_eval_duration"]))
+        for (j, chunk), trans in zip(job, translations):
+            if trans is not None:
+                journal.append(j, chunk, trans)
+        speed = f", {metrics['tokens_per_s']:.1f} tok/s" if "tokens_per_s" in metrics else ""
+        numbers = ", ".join(str(j + 1) for j, _ in job)
+        tokens = sum(estimate_tokens(chunk) for _, chunk in job)
+        print(f"  -> Blocs {numbers}/{len(chunks)} (lot de {len(job)}, ~{tokens} tokens) faits en {time.time()-t_start:.1f}s [{host}{speed}]\n",
+              end="", flush=True)
+        return translations
+
+    def translate_one(j: int, chunk: str, client: ollama.Client, host: str) -> Optional[str]:
+        gpp_metrics.count("chunks")
+        known = manifest.get(chunk)
+        if known is not None:
+            gpp_metrics.count("chunks.manifest")
+            return known
+        known = journal.get(j, chunk)
+        if known is not None:
+            gpp_metrics.count("chunks.journal")
+            return known
+        t_start = time.time()
+        metrics: Dict[str, float] = {}
+        partial_path = f"{output_path}.bloc{j+1}.partial" if stream else None
+        with gpp_metrics.span("translate_chunk"):
+            trans = try_translate_chunk(chunk, system_prompt, memory=memory, client=client,
+                                        stream=stream, partial_path=partial_path, metrics=metrics)
+        if "prompt_eval_count" in metrics:
+            prompt_evals.append((j, metrics["prompt_eval_count"], metrics["prompt_eval_duration"]))
+        if trans is not None:
+            journal.append(j, chunk, trans)
+            if partial_path and os.path.exists(partial_path):
+                os.remove(partial_path)
+        source = "mémoire" if memory and chunk.strip() and memory.last_hit else host
+        speed = f", {metrics['tokens_per_s']:.1f} tok/s" if "tokens_per_s" in metrics else ""
+        if "ttft" in metrics:
+            speed += f", TTFT {metrics['ttft']:.2f}s"
+        # Un seul write() par ligne : les blocs peuvent se terminer en parallèle
+        print(f"  -> Bloc {j+1}/{len(chunks)} (~{estimate_tokens(chunk)} tokens) fait en {time.time()-t_start:.1f}s [{source}{speed}]\n",
+              end="", flush=True)
+        return trans
+
+    # Les résultats reviennent dans l'ordre des blocs, quel que soit l'ordre de fin
+    results: List[Optional[str]] = [None] * len(chunks)
+    for job, translations in zip(jobs, dispatcher.map(translate_job, jobs)):
+        for (j, _), trans in zip(job, translations):
+            results[j] = trans
+    report_prompt_evals(prompt_evals)
+    failures = sum(1 for trans in results if trans is None)
+    translated_chunks = [chunk if trans is None else trans for chunk, trans in zip(chunks, results)]
+
+    full_translation = "\n\n".join(translated_chunks)
+
+    # Sauvegarde : le fichier final n'est assemblé que lorsque tous les blocs sont traduits
+    if failures:
+        print(f"  [INCOMPLET] {failures} blocs en échec ; relancez le script pour reprendre ce fichier.")
+    else:
+        write_file_atomic(output_path, full_translation)
+        manifest.save(content, chunks, translated_chunks)
+        journal.discard()
+        print(f"  [OK] Sauvegardé dans : {output_path}")
+    gpp_metrics.record("file", time.time() - t_file, chapter_key)
+
+    # Contexte pour le chapitre suivant : un résumé de ce chapitre
+    chapter_summary = extract_summary(full_translation)
+    if summaries is not None and not failures:
+        summaries.put(rel_path, text_hash(content), chapter_summary)
+    return {"status": "incomplete" if failures else "ok", "output_path": output_path,
+            "chunks": len(chunks), "failures": failures,
+            "context": f"Dernier chapitre traduit ({rel_path}): {chapter_summary}"}
+
 def main():
+    global ENFORCE_GLOSSARY, DRAFT_MODEL
     parser = argparse.ArgumentParser(description="Traducteur GPP via Ollama")
     parser.add_argument("--test", action="store_true", help="Traduit seulement le premier chapitre trouvé pour tester")
     parser.add_argument("--file", type=str, help="Traduit un fichier spécifique")
+    parser.add_argument("--no-memory", action="store_true", help="Désactive la mémoire de traduction (cache SQLite)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Traduction en streaming : sortie partielle en direct (*.partial), tokens/s et TTFT par bloc")
+    parser.add_argument("--force", action="store_true",
+                        help="Retraduit tout, sans réutiliser le manifeste ni le journal des runs précédents")
+    parser.add_argument("--endpoint", action="append", metavar="HOTE[=N]",
+                        help="Instance Ollama à utiliser avec N requêtes simultanées (option répétable)")
+    parser.add_argument("--report", metavar="FICHIER",
+                        help="Rapport de mesures JSON (+ CSV) de l'exécution (défaut : .cache/metrics/translate.json)")
+    parser.add_argument("--check-glossary", action="store_true",
+                        help="Contrôle les traductions existantes par rapport au glossaire, sans rien traduire")
+    parser.add_argument("--requeue", action="store_true",
+                        help="Remet en file les blocs qui ne respectent pas le glossaire, puis les retraduit")
+    parser.add_argument("--no-glossary-check", action="store_true",
+                        help="Accepte les traductions du modèle sans contrôle du glossaire")
+    parser.add_argument("--draft-model", metavar="MODELE", default=DRAFT_MODEL,
+                        help=f"Mode cascade : traduit d'abord avec ce modèle plus rapide, {MODEL_NAME} seulement si la sortie échoue aux contrôles")
+    parser.add_argument("--no-batch", action="store_true",
+                        help="Envoie chaque bloc dans sa propre requête (pas de regroupement des petits blocs)")
+    parser.add_argument("--context", choices=["chain", "toc"], default=CONTEXT_MODE,
+                        help="Contexte des chapitres : résumé du précédent (chain) ou plan du livre + résumés en cache (toc)")
+    parser.add_argument("--chapters", type=int, default=1, metavar="N",
+                        help="Chapitres traduits en parallèle, du plus long au plus court (mode --context toc uniquement)")
+    parser.add_argument("--plan", action="store_true",
+                        help="Estime la durée du run (par chapitre et totale) d'après les débits mesurés, sans rien traduire")
     args = parser.parse_args()
 
-    setup_model()
-    
+    ENFORCE_GLOSSARY = not args.no_glossary_check
+    DRAFT_MODEL = args.draft_model
+    if args.check_glossary or args.requeue:
+        check_glossary_files(OUTPUT_DIR, requeue=args.requeue)
+        if not args.requeue:
+            print(f"[MÉTRIQUES] Rapport : {gpp_metrics.write_report('translate', args.report)}")
+            return
+
     files_to_process = []
     if args.file:
         files_to_process = [args.file]
@@ -202,51 +1651,82 @@ def main():
 
     print(f"[INFO] {len(files_to_process)} fichiers à traduire.")
 
-    global_context = "" 
-    
-    for i, file_path in enumerate(files_to_process):
-        rel_path = os.path.relpath(file_path, OUTPUT_DIR)
-        print(f"\n[{i+1}/{len(files_to_process)}] Traduction de : {rel_path}")
-        
-        # Vérifier si déjà traduit
-        output_path = file_path.replace(".md", "_fr.md")
-        if os.path.exists(output_path) and not args.file:
-            print(f"  [SKIP] Fichier déjà traduit : {output_path}")
-            # On charge quand même un bout de contexte pour la suite ? 
-            # Pour l'instant on skip juste pour aller vite.
-            continue
-            
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-        chunks = chunk_markdown(content)
-        print(f"  -> Découpé en {len(chunks)} blocs.")
-        
-        translated_chunks = []
-        system_prompt = build_system_prompt(global_context)
-        
-        for j, chunk in enumerate(chunks):
-            print(f"  -> Traduction bloc {j+1}/{len(chunks)} ({len(chunk)} chars)...", end="", flush=True)
-            t_start = time.time()
-            trans = translate_chunk(chunk, system_prompt)
-            translated_chunks.append(trans)
-            print(f" Fait en {time.time()-t_start:.1f}s")
-            
-        full_translation = "\n\n".join(translated_chunks)
-        
-        # Sauvegarde
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(full_translation)
-        print(f"  [OK] Sauvegardé dans : {output_path}")
-        
-        # Mise à jour du contexte pour le chapitre suivant
-        # On ajoute un résumé de ce chapitre au contexte global
-        chapter_summary = extract_summary(full_translation)
-        global_context = f"Dernier chapitre traduit ({rel_path}): {chapter_summary}"
-        
-        if args.test:
-            print("[TEST] Fin du test après un chapitre.")
-            break
+    if args.plan:
+        endpoints = [parse_endpoint(spec) for spec in args.endpoint] if args.endpoint else OLLAMA_ENDPOINTS
+        chapters = args.chapters if args.context == "toc" else 1
+        print_plan(files_to_process, sum(ep["concurrency"] for ep in endpoints), chapters,
+                   force=args.force, skip_translated=not args.file, batch=not (args.no_batch or args.stream))
+        return
+
+    dispatcher = create_dispatcher(args.endpoint)
+
+    memory = None if args.no_memory else TranslationMemory()
+    summaries = SummaryCache()
+    run_start = time.time()
+    total_chunks = 0
+    failed_chunks = 0
+
+    contexts = build_chapter_contexts(files_to_process) if args.context == "toc" else {}
+    if contexts and args.chapters > 1 and not args.test:
+        # Contextes connus d'avance : les chapitres se partagent les emplacements des instances Ollama
+        print(f"[INFO] {args.chapters} chapitres traduits en parallèle (contexte : plan du livre).")
+        # Les plus longs d'abord : un gros chapitre commencé en dernier rallongerait seul la fin du run
+        throughput, _ = load_throughput()
+        durations = {path: estimate_file(path, throughput, args.force,
+                                           batch=not (args.no_batch or args.stream))["seconds"] for path in files_to_process}
+        files_to_process = sorted(files_to_process, key=lambda path: -durations[path])
+
+        def translate_chapter(file_path: str) -> Dict[str, Any]:
+            print(f"\n[CHAPITRE] Traduction de : {os.path.relpath(file_path, OUTPUT_DIR)}\n", end="", flush=True)
+            return translate_file(file_path, dispatcher, memory, contexts[file_path], force=args.force,
+                                  stream=args.stream, skip_translated=not args.file, summaries=summaries,
+                                  batch=not args.no_batch)
+
+        with ThreadPoolExecutor(max_workers=args.chapters) as executor:
+            for result in executor.map(translate_chapter, files_to_process):
+                total_chunks += result["chunks"]
+                failed_chunks += result["failures"]
+    else:
+        global_context = ""
+
+        for i, file_path in enumerate(files_to_process):
+            rel_path = os.path.relpath(file_path, OUTPUT_DIR)
+            print(f"\n[{i+1}/{len(files_to_process)}] Traduction de : {rel_path}")
+
+            result = translate_file(file_path, dispatcher, memory, contexts.get(file_path, global_context),
+                                    force=args.force, stream=args.stream, skip_translated=not args.file,
+                                    summaries=summaries, batch=not args.no_batch)
+            total_chunks += result["chunks"]
+            failed_chunks += result["failures"]
+            global_context = result["context"]
+            if result["status"] == "skipped":
+                continue
+
+            if args.test:
+                print("[TEST] Fin du test après un chapitre.")
+                break
+
+    print(f"\n[RÉSUMÉ] {total_chunks} blocs traités en {time.time()-run_start:.1f}s ({failed_chunks} en échec)")
+    if memory:
+        print(f"  Mémoire de traduction : {memory.hits} réutilisés, {memory.misses} envoyés au modèle")
+        memory.close()
+    counters = gpp_metrics.summary()["counters"]
+    if counters.get("glossary.violations"):
+        print(f"  Glossaire : {counters['glossary.violations']:.0f} traductions refusées, "
+              f"{counters.get('glossary.accepted', 0):.0f} blocs conservés hors glossaire (voir --check-glossary)")
+    if counters.get("batch.requests"):
+        print(f"  Requêtes groupées : {counters['batch.requests']:.0f} ({counters.get('batch.segments', 0):.0f} blocs), "
+              f"{counters.get('batch.fallbacks', 0):.0f} retraduites bloc par bloc "
+              f"({counters.get('batch.fallbacks', 0) / counters['batch.requests']:.0%}), "
+              f"{counters.get('batch.segment_fallbacks', 0):.0f} segments refusés")
+    cascade = cascade_report()
+    if cascade:
+        print(f"  Cascade : {cascade}")
+    throughput = save_throughput()
+    if throughput:
+        print(f"  Débits enregistrés pour --plan : {throughput['output_tps']:.1f} tokens générés/s, "
+              f"{throughput['overhead_s']:.2f}s par requête")
+    print(f"[MÉTRIQUES] Rapport : {gpp_metrics.write_report('translate', args.report)}")
 
 if __name__ == "__main__":
     main()
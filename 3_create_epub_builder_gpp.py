@@ -1,20 +1,61 @@
 import os
+import re
+import time
+import uuid
+import json
+import hashlib
+import zipfile
+import argparse
+import posixpath
+from html import escape
+from html.parser import HTMLParser
+from datetime import datetime, timezone
+import markdown
+import yaml
+import gpp_metrics
 
 # Configuration
 BOOK_DIR = "book"
 OUTPUT_SCRIPT = "build-epub.ps1"
 EPUB_NAME = "game-programming-patterns-fr.epub"
 METADATA_FILE = "metadata.yaml"
+COVER_IMAGE = "cover.jpg"
+TOC_DEPTH = 2
+
+# Cache de rendu par chapitre (XHTML + images référencées), indexé par le contenu du chapitre
+RENDER_CACHE_DIR = os.path.join(".cache", "epub")
+# À incrémenter dès que render_chapter() change de sortie, pour invalider le cache
+RENDER_VERSION = 1
+
+MEDIA_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".gif": "image/gif",
+    ".svg": "image/svg+xml",
+    ".webp": "image/webp",
+}
+
+STYLESHEET = """body { font-family: serif; line-height: 1.5; margin: 0 5%; }
+h1, h2, h3 { font-family: sans-serif; line-height: 1.2; }
+pre { white-space: pre-wrap; font-size: 0.85em; background: #f4f4f4; padding: 0.5em; }
+code { font-family: monospace; }
+img { max-width: 100%; }
+table { border-collapse: collapse; }
+td, th { border: 1px solid #999; padding: 0.2em 0.5em; }
+aside { font-size: 0.9em; border-left: 3px solid #ccc; padding-left: 0.8em; }
+"""
 
 def find_french_files(root_dir):
     """
     Parcourt récursivement root_dir et trouve tous les fichiers finissant par -fr.md
+    (ou _fr.md, le nom produit par 2_translate_gpp.py).
     Retourne une liste de chemins relatifs.
     """
     french_files = []
     for root, dirs, files in os.walk(root_dir):
         for file in files:
-            if file.endswith("-fr.md"):
+            if file.endswith("-fr.md") or file.endswith("_fr.md"):
                 # Construit le chemin relatif depuis le dossier racine du projet
                 full_path = os.path.join(root, file)
                 # Normalisation des séparateurs pour éviter les soucis sous Windows/PS
@@ -56,8 +97,14 @@ def sort_files(files):
     Mais le dossier s'appelle 'i-acknowledgements'.
     
     On va faire un tri simple pour commencer.
+    Seule exception : la préface 'i-acknowledgements' (minuscule) passerait après les sections
+    en ASCII, on la place donc explicitement en tête.
     """
-    return sorted(files)
+    def sort_key(path):
+        parts = os.path.normpath(path).split(os.sep)
+        top = parts[1] if len(parts) > 1 else parts[0]
+        return (0 if top[:1].islower() else 1, path)
+    return sorted(files, key=sort_key)
 
 def generate_powershell_script(files):
     """
@@ -96,7 +143,367 @@ if (Test-Path $outputFile) {{
 """
     return script_content
 
+# --- ÉCRITURE NATIVE DE L'EPUB ---
+
+class XHTMLWriter(HTMLParser):
+    """
+    Re-sérialise le HTML produit par Markdown (qui peut contenir du HTML brut, <br>, &nbsp;...)
+    en XHTML bien formé, exigé par EPUB3 : balises vides auto-fermées, entités converties,
+    balises non fermées refermées.
+    """
+    VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self.stack = []
+
+    def _attrs(self, attrs):
+        return "".join(f' {name}="{escape(value if value is not None else name, quote=True)}"' for name, value in attrs)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.VOID_TAGS:
+            self.out.append(f"<{tag}{self._attrs(attrs)}/>")
+        else:
+            self.out.append(f"<{tag}{self._attrs(attrs)}>")
+            self.stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.out.append(f"<{tag}{self._attrs(attrs)}/>")
+
+    def handle_endtag(self, tag):
+        if tag not in self.stack:
+            return
+        while self.stack:
+            open_tag = self.stack.pop()
+            self.out.append(f"</{open_tag}>")
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        self.out.append(escape(data, quote=False))
+
+    def result(self):
+        self.close()
+        while self.stack:
+            self.out.append(f"</{self.stack.pop()}>")
+        return "".join(self.out)
+
+def to_xhtml(html):
+    writer = XHTMLWriter()
+    writer.feed(html)
+    return writer.result()
+
+def load_metadata(path):
+    """Charge metadata.yaml (même format que pour Pandoc)."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+def image_entry_name(image_path):
+    """Nom de l'image dans l'archive, dérivé de son contenu : une image dupliquée n'est stockée qu'une fois."""
+    with open(image_path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:16]
+    return f"images/{digest}{os.path.splitext(image_path)[1].lower()}"
+
+def render_chapter(md_path, index):
+    """
+    Convertit un chapitre markdown en page XHTML.
+    Retourne un dict : id, fichier, titre, entrées de table des matières (id, titre, enfants)
+    et images référencées {chemin source: nom dans l'archive}.
+    """
+    with open(md_path, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    converter = markdown.Markdown(extensions=["fenced_code", "tables", "toc"], output_format="xhtml")
+    body = to_xhtml(converter.convert(text))
+
+    chapter_dir = os.path.dirname(md_path)
+    images = {}
+
+    def replace_src(match):
+        src = match.group(2)
+        if re.match(r"^[a-z]+:", src):
+            return match.group(0)
+        image_path = os.path.normpath(os.path.join(chapter_dir, src))
+        if not os.path.exists(image_path):
+            print(f"  [ATTENTION] Image introuvable : {image_path}")
+            return match.group(0)
+        images[image_path] = image_entry_name(image_path)
+        return f'{match.group(1)}../{images[image_path]}{match.group(3)}'
+
+    body = re.sub(r'(<img\b[^>]*?\bsrc=")([^"]+)(")', replace_src, body)
+
+    def toc_entries(tokens, depth):
+        if depth > TOC_DEPTH:
+            return []
+        return [{"id": t["id"], "title": t["name"], "children": toc_entries(t["children"], depth + 1)} for t in tokens]
+
+    entries = toc_entries(converter.toc_tokens, 1)
+    # Le premier titre de niveau 1 donne le titre du chapitre ; ses sous-titres forment la table des matières
+    if entries:
+        title, headings = entries[0]["title"], entries[0]["children"] + entries[1:]
+    else:
+        title, headings = os.path.basename(md_path), []
+
+    chapter_id = f"ch{index:02d}"
+    xhtml = f"""<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="fr" xml:lang="fr">
+<head>
+<meta charset="utf-8"/>
+<title>{escape(title)}</title>
+<link rel="stylesheet" type="text/css" href="../style.css"/>
+</head>
+<body>
+<section epub:type="chapter">
+{body}
+</section>
+</body>
+</html>
+"""
+    return {
+        "id": chapter_id,
+        "href": f"text/{chapter_id}.xhtml",
+        "title": title,
+        "headings": headings,
+        "xhtml": xhtml,
+        "images": images,
+    }
+
+def render_chapter_cached(md_path, index, use_cache=True):
+    """
+    render_chapter() avec cache disque : la clé est le hash du markdown (+ position dans le livre).
+    Une entrée n'est réutilisée que si chaque image référencée a toujours le même contenu.
+    Retourne (chapitre, clé de cache, vrai si servi depuis le cache).
+    """
+    with open(md_path, "rb") as f:
+        source = f.read()
+    key = hashlib.sha256(f"{RENDER_VERSION}|{index}|".encode("utf-8") + source).hexdigest()
+    cache_path = os.path.join(RENDER_CACHE_DIR, f"{key}.json")
+
+    if use_cache and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                chapter = json.load(f)
+            if all(os.path.exists(path) and image_entry_name(path) == name for path, name in chapter["images"].items()):
+                return chapter, key, True
+        except (OSError, ValueError, KeyError):
+            pass
+
+    chapter = render_chapter(md_path, index)
+    os.makedirs(RENDER_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(chapter, f, ensure_ascii=False)
+    os.replace(tmp_path, cache_path)
+    return chapter, key, False
+
+def prune_render_cache(used_keys):
+    """Supprime les entrées du cache de rendu qui ne correspondent plus à aucun chapitre."""
+    if not os.path.isdir(RENDER_CACHE_DIR):
+        return
+    for name in os.listdir(RENDER_CACHE_DIR):
+        if name.endswith(".json") and name[:-5] not in used_keys and name != "build.json":
+            os.remove(os.path.join(RENDER_CACHE_DIR, name))
+
+def build_nav(chapters, title):
+    """Document de navigation EPUB3 (nav.xhtml)."""
+    def items(chapter, entries):
+        lines = []
+        for entry in entries:
+            children = items(chapter, entry["children"])
+            nested = f"<ol>{children}</ol>" if children else ""
+            lines.append(f'<li><a href="{chapter["href"]}#{entry["id"]}">{escape(entry["title"])}</a>{nested}</li>')
+        return "".join(lines)
+
+    toc = []
+    for chapter in chapters:
+        children = items(chapter, chapter["headings"])
+        nested = f"<ol>{children}</ol>" if children else ""
+        toc.append(f'<li><a href="{chapter["href"]}">{escape(chapter["title"])}</a>{nested}</li>')
+    toc_items = "\n".join(toc)
+
+    return f"""<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="fr" xml:lang="fr">
+<head><meta charset="utf-8"/><title>{escape(title)}</title></head>
+<body>
+<nav epub:type="toc" id="toc">
+<h1>Table des matières</h1>
+<ol>
+{toc_items}
+</ol>
+</nav>
+</body>
+</html>
+"""
+
+def build_ncx(chapters, title, identifier):
+    """Table des matières NCX (compatibilité liseuses EPUB2)."""
+    points = []
+    order = 0
+
+    def nav_point(label, src, children):
+        nonlocal order
+        order += 1
+        point_id = f"nav{order}"
+        return (f'<navPoint id="{point_id}" playOrder="{order}"><navLabel><text>{escape(label)}</text></navLabel>'
+                f'<content src="{src}"/>{"".join(children)}</navPoint>')
+
+    def entries(chapter, items):
+        return [nav_point(e["title"], f'{chapter["href"]}#{e["id"]}', entries(chapter, e["children"])) for e in items]
+
+    for chapter in chapters:
+        points.append(nav_point(chapter["title"], chapter["href"], entries(chapter, chapter["headings"])))
+    nav_points = "\n".join(points)
+
+    return f"""<?xml version="1.0" encoding="utf-8"?>
+<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">
+<head><meta name="dtb:uid" content="{identifier}"/><meta name="dtb:depth" content="{TOC_DEPTH + 1}"/></head>
+<docTitle><text>{escape(title)}</text></docTitle>
+<navMap>
+{nav_points}
+</navMap>
+</ncx>
+"""
+
+def build_opf(chapters, images, metadata, identifier, cover_name):
+    """Paquet OPF : métadonnées, manifeste et ordre de lecture (spine)."""
+    title = metadata.get("title", "Game Programming Patterns")
+    meta = [f'<dc:identifier id="book-id">{identifier}</dc:identifier>',
+            f"<dc:title>{escape(title)}</dc:title>",
+            f'<dc:language>{escape(metadata.get("language", "fr"))}</dc:language>',
+            f'<meta property="dcterms:modified">{datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")}</meta>']
+
+    creators = metadata.get("creator", [])
+    if isinstance(creators, (str, dict)):
+        creators = [creators]
+    roles = {"author": "aut", "translator": "trl", "editor": "edt"}
+    for n, creator in enumerate(creators):
+        if isinstance(creator, str):
+            creator = {"text": creator}
+        meta.append(f'<dc:creator id="creator{n}">{escape(creator.get("text", ""))}</dc:creator>')
+        if creator.get("role"):
+            role = roles.get(creator["role"], creator["role"])
+            meta.append(f'<meta refines="#creator{n}" property="role" scheme="marc:relators">{role}</meta>')
+    for key in ("rights", "description", "publisher"):
+        if metadata.get(key):
+            meta.append(f"<dc:{key}>{escape(str(metadata[key]))}</dc:{key}>")
+    if cover_name:
+        meta.append('<meta name="cover" content="cover-image"/>')
+
+    manifest = ['<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>',
+                '<item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>',
+                '<item id="css" href="style.css" media-type="text/css"/>']
+    for chapter in chapters:
+        manifest.append(f'<item id="{chapter["id"]}" href="{chapter["href"]}" media-type="application/xhtml+xml"/>')
+    for n, name in enumerate(sorted(images)):
+        media_type = MEDIA_TYPES.get(posixpath.splitext(name)[1], "application/octet-stream")
+        properties = ' properties="cover-image"' if name == cover_name else ""
+        item_id = "cover-image" if name == cover_name else f"img{n}"
+        manifest.append(f'<item id="{item_id}" href="{name}" media-type="{media_type}"{properties}/>')
+
+    spine = "\n".join(f'<itemref idref="{chapter["id"]}"/>' for chapter in chapters)
+    meta_xml = "\n".join(meta)
+    manifest_xml = "\n".join(manifest)
+    return f"""<?xml version="1.0" encoding="utf-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id" xml:lang="fr">
+<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+{meta_xml}
+</metadata>
+<manifest>
+{manifest_xml}
+</manifest>
+<spine toc="ncx">
+{spine}
+</spine>
+</package>
+"""
+
+CONTAINER_XML = """<?xml version="1.0" encoding="utf-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>
+</container>
+"""
+
+def build_epub(files, output_path, metadata_file=METADATA_FILE, use_cache=True):
+    """
+    Construit l'EPUB3 directement (sans Pandoc) à partir des chapitres triés.
+    Les images sont résolues relativement à chaque chapitre et stockées une seule fois.
+    Seuls les chapitres modifiés (markdown ou images) sont re-rendus ; si rien n'a changé depuis
+    la dernière construction, l'archive existante est conservée.
+    Retourne (nb chapitres, nb images, nb chapitres re-rendus), ou None si l'EPUB était déjà à jour.
+    """
+    metadata = load_metadata(metadata_file)
+    title = metadata.get("title", "Game Programming Patterns")
+    # Identifiant stable d'une construction à l'autre (dérivé du titre)
+    identifier = f"urn:uuid:{uuid.uuid5(uuid.NAMESPACE_URL, title)}"
+
+    chapters = []
+    keys = []
+    rendered = 0
+    for n, path in enumerate(files):
+        # Mesures rattachées au dossier du chapitre, comme dans les rapports de scraping et de traduction
+        chapter_key = os.path.relpath(os.path.dirname(path), BOOK_DIR).replace(os.sep, "/")
+        with gpp_metrics.chapter(chapter_key), gpp_metrics.span("render"):
+            chapter, key, cached = render_chapter_cached(path, n + 1, use_cache)
+        gpp_metrics.count("chapters.cached" if cached else "chapters.rendered", chapter_name=chapter_key)
+        chapters.append(chapter)
+        keys.append(key)
+        rendered += 0 if cached else 1
+
+    images = {}
+    for chapter in chapters:
+        for source, name in chapter["images"].items():
+            images[name] = source
+    cover_name = None
+    if os.path.exists(COVER_IMAGE):
+        cover_name = image_entry_name(COVER_IMAGE)
+        images[cover_name] = COVER_IMAGE
+
+    # Empreinte de la construction complète : chapitres, images, métadonnées, couverture
+    build_hash = hashlib.sha256(json.dumps([keys, sorted(images), metadata, cover_name, os.path.abspath(output_path)],
+                                           sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    build_state_path = os.path.join(RENDER_CACHE_DIR, "build.json")
+    if use_cache and os.path.exists(output_path) and os.path.exists(build_state_path):
+        with open(build_state_path, "r", encoding="utf-8") as f:
+            if json.load(f).get("build_hash") == build_hash:
+                return None
+
+    tmp_path = f"{output_path}.tmp"
+    with gpp_metrics.span("zip"), zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as epub:
+        # Le fichier mimetype doit être le premier, non compressé
+        epub.writestr(zipfile.ZipInfo("mimetype"), "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        epub.writestr("META-INF/container.xml", CONTAINER_XML)
+        epub.writestr("OEBPS/content.opf", build_opf(chapters, images, metadata, identifier, cover_name))
+        epub.writestr("OEBPS/nav.xhtml", build_nav(chapters, title))
+        epub.writestr("OEBPS/toc.ncx", build_ncx(chapters, title, identifier))
+        epub.writestr("OEBPS/style.css", STYLESHEET)
+        for chapter in chapters:
+            epub.writestr(f"OEBPS/{chapter['href']}", chapter["xhtml"])
+        for name, source in sorted(images.items()):
+            # Les images sont déjà compressées : inutile de les dégonfler à nouveau
+            epub.write(source, f"OEBPS/{name}", compress_type=zipfile.ZIP_STORED)
+    os.replace(tmp_path, output_path)
+
+    os.makedirs(RENDER_CACHE_DIR, exist_ok=True)
+    with open(build_state_path, "w", encoding="utf-8") as f:
+        json.dump({"build_hash": build_hash}, f)
+    prune_render_cache(set(keys))
+    return len(chapters), len(images), rendered
+
 def main():
+    parser = argparse.ArgumentParser(description="Constructeur EPUB GPP")
+    parser.add_argument("--pandoc", action="store_true",
+                        help=f"Génère {OUTPUT_SCRIPT} (conversion via Pandoc/PowerShell) au lieu de construire l'EPUB directement")
+    parser.add_argument("-o", "--output", default=EPUB_NAME, help="Fichier EPUB à produire")
+    parser.add_argument("--no-cache", action="store_true", help="Re-rend tous les chapitres sans utiliser le cache")
+    parser.add_argument("--report", metavar="FICHIER",
+                        help="Rapport de mesures JSON (+ CSV) de l'exécution (défaut : .cache/metrics/epub.json)")
+    args = parser.parse_args()
+
     print(f"Recherche des fichiers dans '{BOOK_DIR}'...")
     if not os.path.exists(BOOK_DIR):
         print(f"Erreur: Le dossier '{BOOK_DIR}' n'existe pas.")
@@ -116,13 +523,27 @@ def main():
     for f in sorted_files:
         print(f" - {f}")
 
-    script_content = generate_powershell_script(sorted_files)
-    
-    with open(OUTPUT_SCRIPT, "w", encoding="utf-8") as f:
-        f.write(script_content)
-    
-    print(f"\nScript de build généré : {OUTPUT_SCRIPT}")
-    print("Exécutez-le avec PowerShell pour créer l'epub.")
+    if args.pandoc:
+        script_content = generate_powershell_script(sorted_files)
+        
+        with open(OUTPUT_SCRIPT, "w", encoding="utf-8") as f:
+            f.write(script_content)
+        
+        print(f"\nScript de build généré : {OUTPUT_SCRIPT}")
+        print("Exécutez-le avec PowerShell pour créer l'epub.")
+        return
+
+    t_start = time.time()
+    result = build_epub(sorted_files, args.output, use_cache=not args.no_cache)
+    report_path = gpp_metrics.write_report("epub", args.report)
+    if result is None:
+        print(f"\nEPUB déjà à jour : {args.output} (aucun chapitre modifié, {time.time()-t_start:.2f}s)")
+        return
+    chapter_count, image_count, rendered = result
+    size = os.path.getsize(args.output)
+    print(f"\nSuccès ! EPUB généré : {args.output} ({chapter_count} chapitres dont {rendered} re-rendus, "
+          f"{image_count} images, {size} bytes) en {time.time()-t_start:.2f}s")
+    print(f"Rapport de mesures : {report_path}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,495 @@
+import os
+import re
+import json
+import mmap
+import math
+import time
+import struct
+import hashlib
+import argparse
+import unicodedata
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# --- CONFIGURATION ---
+
+BOOK_DIR = "book"
+# Index plein texte du livre (sources anglaises et traductions), dans un seul fichier binaire lu par mmap
+INDEX_PATH = os.path.join(".cache", "search-index.bin")
+
+# Paramètres du classement BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+SNIPPET_CHARS = 70        # Contexte affiché de chaque côté d'une occurrence
+SNIPPETS_PER_HIT = 2      # Extraits affichés par fichier trouvé
+DEFAULT_LIMIT = 10
+
+# Format du fichier (tous les entiers en little-endian) :
+#   en-tête   : magic, version, nombre de termes, position/longueur de la table des documents (JSON),
+#               position de la table des termes, position des chaînes des termes
+#   documents : JSON (chemin, langue, partie, chapitre, titre, titres de sections, nombre de tokens...)
+#   termes    : une entrée de taille fixe par terme, triée par terme (recherche dichotomique dans le mmap)
+#   chaînes   : termes en UTF-8, bout à bout
+#   postings  : pour chaque terme, par document : Δdocument, nombre d'occurrences puis, par occurrence,
+#               Δposition (en tokens) et Δposition (en caractères), le tout en varints
+INDEX_MAGIC = b"GPPSRCH1"
+INDEX_VERSION = 1
+HEADER = struct.Struct("<8sIIQQQQ")
+TERM_ENTRY = struct.Struct("<QHIQI")  # position du terme, longueur, nb de documents, position des postings, longueur
+
+# Mots : lettres et chiffres (les apostrophes séparent : « l'objet » -> « l », « objet »)
+TOKEN_RE = re.compile(r"[^\W_]+")
+# Cibles des liens et images : indexer les URL et les noms d'assets n'aurait aucun intérêt
+LINK_TARGET_RE = re.compile(r'\]\(([^)\s]*(?:\s+"[^"]*")?)\)')
+HEADING_RE = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
+FENCE_RE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+QUERY_RE = re.compile(r'"([^"]+)"|(\S+)')
+WHITESPACE_RE = re.compile(r'\s+')
+
+# --- ANALYSE DES FICHIERS ---
+
+@lru_cache(maxsize=65536)
+def fold(word: str) -> str:
+    """Forme indexée d'un mot : minuscules, sans accents (« Découplage » -> « decouplage »)."""
+    decomposed = unicodedata.normalize("NFKD", word.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+def tokenize(text: str) -> Iterator[Tuple[int, str]]:
+    """(position en caractères, terme) de chaque mot du texte."""
+    for match in TOKEN_RE.finditer(text):
+        yield match.start(), fold(match.group())
+
+def find_book_files(root_dir: str) -> List[str]:
+    """Sources (.md) et traductions (_fr.md / -fr.md) du livre, hors README."""
+    paths = []
+    for root, dirs, files in os.walk(root_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(".md") and name != "README.md":
+                paths.append(os.path.join(root, name))
+    return paths
+
+def describe(path: str, text: str, root_dir: str = BOOK_DIR) -> Dict:
+    """Métadonnées d'un fichier : langue, partie et chapitre (dossiers), titre et sections (titres markdown)."""
+    rel_path = os.path.relpath(path, root_dir).replace(os.sep, "/")
+    folders = rel_path.split("/")[:-1]
+    headings = []
+    in_code = False
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        if FENCE_RE.match(line):
+            in_code = not in_code
+        elif not in_code:
+            match = HEADING_RE.match(line)
+            if match:
+                headings.append([offset, len(match.group(1)), match.group(2)])
+        offset += len(line)
+    name = os.path.basename(path)
+    return {
+        "path": rel_path,
+        "lang": "fr" if name.endswith("_fr.md") or name.endswith("-fr.md") else "en",
+        "part": folders[0] if folders else "",
+        "chapter": folders[-1] if folders else "",
+        "title": next((title for _, level, title in headings if level == 1), name),
+        "headings": headings,
+    }
+
+def index_text(text: str) -> Tuple[Dict[str, List[Tuple[int, int]]], int]:
+    """Occurrences (position en tokens, position en caractères) de chaque terme, et nombre de tokens."""
+    # Les cibles de liens sont remplacées par des espaces : les positions restent celles du fichier
+    text = LINK_TARGET_RE.sub(lambda m: "](" + " " * len(m.group(1)) + ")", text)
+    terms: Dict[str, List[Tuple[int, int]]] = {}
+    count = 0
+    for count, (char_pos, term) in enumerate(tokenize(text), 1):
+        terms.setdefault(term, []).append((count - 1, char_pos))
+    return terms, count
+
+# --- ENCODAGE ---
+
+def encode_varint(value: int, out: bytearray) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def decode_varints(data: bytes) -> List[int]:
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+    return values
+
+def encode_postings(postings: List[Tuple[int, List[Tuple[int, int]]]]) -> bytes:
+    out = bytearray()
+    previous_doc = 0
+    for doc_id, occurrences in postings:
+        encode_varint(doc_id - previous_doc, out)
+        encode_varint(len(occurrences), out)
+        previous_doc = doc_id
+        last_token = last_char = 0
+        for token_pos, char_pos in occurrences:
+            encode_varint(token_pos - last_token, out)
+            encode_varint(char_pos - last_char, out)
+            last_token, last_char = token_pos, char_pos
+    return bytes(out)
+
+def decode_postings(data: bytes) -> Dict[int, List[Tuple[int, int]]]:
+    values = decode_varints(data)
+    postings = {}
+    i = doc_id = 0
+    while i < len(values):
+        doc_id += values[i]
+        count = values[i + 1]
+        i += 2
+        occurrences = []
+        token_pos = char_pos = 0
+        for _ in range(count):
+            token_pos += values[i]
+            char_pos += values[i + 1]
+            occurrences.append((token_pos, char_pos))
+            i += 2
+        postings[doc_id] = occurrences
+    return postings
+
+# --- LECTURE DE L'INDEX ---
+
+class SearchIndex:
+    """
+    Index ouvert en mmap : seuls l'en-tête et la table des documents sont lus à l'ouverture.
+    Un terme est trouvé par dichotomie dans la table des termes et seuls ses postings sont décodés.
+    """
+
+    def __init__(self, path: str = INDEX_PATH):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.term_count, docs_offset, docs_length, self._table, self._strings = \
+            HEADER.unpack_from(self._mm, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            self.close()
+            raise ValueError(f"format d'index inconnu : {path}")
+        meta = json.loads(self._mm[docs_offset:docs_offset + docs_length])
+        self.docs: List[Dict] = meta["docs"]
+        self.avg_length = meta["avg_length"]
+
+    def close(self) -> None:
+        self._mm.close()
+        self._file.close()
+
+    def term_at(self, i: int) -> Tuple[bytes, int, int, int]:
+        """(terme en UTF-8, nb de documents, position et longueur des postings) de la i-ème entrée."""
+        offset, length, df, postings_offset, postings_length = TERM_ENTRY.unpack_from(
+            self._mm, self._table + i * TERM_ENTRY.size)
+        start = self._strings + offset
+        return self._mm[start:start + length], df, postings_offset, postings_length
+
+    def _lower_bound(self, key: bytes) -> int:
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.term_at(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def terms(self, term: str, prefix: bool = False) -> List[Tuple[str, int, int]]:
+        """Entrées (terme, position, longueur des postings) égales au terme, ou qui commencent par lui."""
+        key = term.encode("utf-8")
+        found = []
+        i = self._lower_bound(key)
+        while i < self.term_count:
+            entry, _, offset, length = self.term_at(i)
+            if entry != key and not (prefix and entry.startswith(key)):
+                break
+            found.append((entry.decode("utf-8"), offset, length))
+            i += 1
+        return found
+
+    def postings(self, term: str, prefix: bool = False) -> Dict[int, List[Tuple[int, int]]]:
+        """Occurrences du terme (de tous les termes du préfixe) par document."""
+        merged: Dict[int, List[Tuple[int, int]]] = {}
+        for _, offset, length in self.terms(term, prefix):
+            for doc_id, occurrences in decode_postings(self._mm[offset:offset + length]).items():
+                merged.setdefault(doc_id, []).extend(occurrences)
+        if prefix:
+            for occurrences in merged.values():
+                occurrences.sort()
+        return merged
+
+    def all_postings(self) -> Iterator[Tuple[str, Dict[int, List[Tuple[int, int]]]]]:
+        """Parcours complet de l'index (mise à jour incrémentale)."""
+        for i in range(self.term_count):
+            term, _, offset, length = self.term_at(i)
+            yield term.decode("utf-8"), decode_postings(self._mm[offset:offset + length])
+
+# --- CONSTRUCTION ---
+
+def file_signature(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+def open_index(path: str = INDEX_PATH) -> Optional[SearchIndex]:
+    if not os.path.exists(path):
+        return None
+    try:
+        return SearchIndex(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[ATTENTION] Index illisible, reconstruction complète : {e}")
+        return None
+
+def stale_files(index: Optional[SearchIndex], paths: List[str], root_dir: str = BOOK_DIR) -> int:
+    """Nombre de fichiers ajoutés, supprimés ou modifiés depuis la construction de l'index (stat seulement)."""
+    if index is None:
+        return len(paths) or 1
+    known = {doc["path"]: (doc["mtime_ns"], doc["size"]) for doc in index.docs}
+    current = {os.path.relpath(path, root_dir).replace(os.sep, "/"): file_signature(path) for path in paths}
+    changed = sum(1 for rel_path, signature in current.items() if known.get(rel_path) != tuple(signature))
+    return changed + sum(1 for rel_path in known if rel_path not in current)
+
+def build_index(root_dir: str = BOOK_DIR, path: str = INDEX_PATH, force: bool = False) -> Dict[str, int]:
+    """
+    Construit ou met à jour l'index. Seuls les fichiers modifiés (taille/date, puis hash) sont relus et
+    découpés ; les occurrences des autres sont reprises telles quelles de l'index précédent.
+    Retourne les statistiques de la construction.
+    """
+    paths = find_book_files(root_dir)
+    old = None if force else open_index(path)
+    stats = {"files": len(paths), "reindexed": 0, "reused": 0, "terms": 0, "postings": 0, "bytes": 0}
+    if old is not None and not stale_files(old, paths, root_dir):
+        stats.update(reused=len(paths), terms=old.term_count, bytes=os.path.getsize(path))
+        old.close()
+        return stats
+
+    old_docs = {doc["path"]: (doc_id, doc) for doc_id, doc in enumerate(old.docs)} if old else {}
+    docs: List[Dict] = []
+    reused: Dict[int, int] = {}  # ancien identifiant -> nouveau, pour les fichiers inchangés
+    terms: Dict[str, List[Tuple[int, List[Tuple[int, int]]]]] = {}
+    for path_on_disk in paths:
+        rel_path = os.path.relpath(path_on_disk, root_dir).replace(os.sep, "/")
+        mtime_ns, size = file_signature(path_on_disk)
+        previous = old_docs.get(rel_path)
+        if previous and (previous[1]["mtime_ns"], previous[1]["size"]) == (mtime_ns, size):
+            reused[previous[0]] = len(docs)
+            docs.append(previous[1])
+            continue
+        with open(path_on_disk, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        if previous and previous[1]["sha256"] == digest:
+            # Fichier réécrit à l'identique (ex. nouveau scraping) : seule sa date change
+            reused[previous[0]] = len(docs)
+            docs.append(dict(previous[1], mtime_ns=mtime_ns))
+            continue
+        text = raw.decode("utf-8")
+        doc = describe(path_on_disk, text, root_dir)
+        doc_terms, doc["length"] = index_text(text)
+        doc.update(mtime_ns=mtime_ns, size=size, sha256=digest)
+        for term, occurrences in doc_terms.items():
+            terms.setdefault(term, []).append((len(docs), occurrences))
+        docs.append(doc)
+        stats["reindexed"] += 1
+
+    if old is not None:
+        if reused:
+            for term, postings in old.all_postings():
+                kept = [(reused[doc_id], occ) for doc_id, occ in postings.items() if doc_id in reused]
+                if kept:
+                    terms.setdefault(term, []).extend(kept)
+        old.close()
+    stats["reused"] = len(reused)
+
+    write_index(path, docs, terms)
+    stats.update(terms=len(terms), postings=sum(len(occ) for postings in terms.values() for _, occ in postings),
+                 bytes=os.path.getsize(path))
+    return stats
+
+def write_index(path: str, docs: List[Dict], terms: Dict[str, List[Tuple[int, List[Tuple[int, int]]]]]) -> None:
+    """Écrit l'index complet dans un fichier temporaire puis le renomme (jamais d'index à moitié écrit)."""
+    avg_length = sum(doc["length"] for doc in docs) / max(1, len(docs))
+    docs_blob = json.dumps({"docs": docs, "avg_length": avg_length}, ensure_ascii=False).encode("utf-8")
+    encoded_terms = sorted((term.encode("utf-8"), postings) for term, postings in terms.items())
+
+    strings = bytearray()
+    table = bytearray()
+    postings_blob = bytearray()
+    docs_offset = HEADER.size
+    table_offset = docs_offset + len(docs_blob)
+    strings_offset = table_offset + TERM_ENTRY.size * len(encoded_terms)
+    entries = []
+    for term, postings in encoded_terms:
+        postings.sort(key=lambda item: item[0])
+        data = encode_postings(postings)
+        entries.append((len(strings), len(term), len(postings), len(postings_blob), len(data)))
+        strings += term
+        postings_blob += data
+    postings_offset = strings_offset + len(strings)
+    for string_offset, length, df, offset, data_length in entries:
+        table += TERM_ENTRY.pack(string_offset, length, df, postings_offset + offset, data_length)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(encoded_terms), docs_offset, len(docs_blob),
+                            table_offset, strings_offset))
+        f.write(docs_blob)
+        f.write(table)
+        f.write(strings)
+        f.write(postings_blob)
+    os.replace(tmp_path, path)
+
+# --- RECHERCHE ---
+
+def parse_query(query: str) -> List[Tuple[List[str], bool]]:
+    """
+    Éléments de la requête : mots, expressions entre guillemets (« "Object Pool" ») et préfixes (« décou* »).
+    Retourne [(termes, préfixe sur le dernier terme)].
+    """
+    items = []
+    for phrase, word in QUERY_RE.findall(query):
+        text = phrase or word
+        prefix = text.endswith("*")
+        words = [term for _, term in tokenize(text)]
+        if words:
+            items.append((words, prefix))
+    return items
+
+def phrase_matches(index: SearchIndex, words: List[str], prefix: bool) -> Dict[int, List[Tuple[int, int, int]]]:
+    """
+    Occurrences (position en tokens, position en caractères du premier mot, nombre de mots)
+    d'un mot ou d'une expression.
+    """
+    postings = [index.postings(word, prefix and n == len(words) - 1) for n, word in enumerate(words)]
+    matches = {}
+    for doc_id, first in postings[0].items():
+        occurrences = first
+        for offset, following in enumerate(postings[1:], 1):
+            positions = {token_pos for token_pos, _ in following.get(doc_id, ())}
+            occurrences = [occ for occ in occurrences if occ[0] + offset in positions]
+            if not occurrences:
+                break
+        if occurrences:
+            matches[doc_id] = [(token_pos, char_pos, len(words)) for token_pos, char_pos in occurrences]
+    return matches
+
+def section_of(doc: Dict, char_pos: int) -> str:
+    """Titre de la section qui contient la position (dernier titre qui la précède)."""
+    offsets = [offset for offset, _, _ in doc["headings"]]
+    i = bisect_right(offsets, char_pos) - 1
+    return doc["headings"][i][2] if i >= 0 else ""
+
+def snippet(text: str, char_pos: int, length: int) -> str:
+    """Extrait centré sur l'occurrence, sur une ligne, l'occurrence entre ** **."""
+    start = max(0, char_pos - SNIPPET_CHARS)
+    end = min(len(text), char_pos + length + SNIPPET_CHARS)
+    before = WHITESPACE_RE.sub(" ", text[start:char_pos]).lstrip()
+    after = WHITESPACE_RE.sub(" ", text[char_pos + length:end]).rstrip()
+    return (f"{'…' if start else ''}{before}**{text[char_pos:char_pos + length]}**"
+            f"{after}{'…' if end < len(text) else ''}")
+
+def search(index: SearchIndex, query: str, lang: Optional[str] = None, limit: int = DEFAULT_LIMIT) -> List[Dict]:
+    """
+    Fichiers contenant tous les éléments de la requête, classés par BM25
+    (chaque expression compte comme un terme). Retourne au plus `limit` résultats.
+    """
+    items = parse_query(query)
+    if not items:
+        return []
+    allowed = {doc_id for doc_id, doc in enumerate(index.docs) if lang is None or doc["lang"] == lang}
+    matches = [phrase_matches(index, words, prefix) for words, prefix in items]
+    candidates = set(allowed)
+    for match in matches:
+        candidates &= set(match)
+
+    count = len(allowed)
+    scores = {}
+    for doc_id in candidates:
+        doc = index.docs[doc_id]
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * doc["length"] / max(1.0, index.avg_length))
+        score = 0.0
+        for match in matches:
+            df = sum(1 for other in match if other in allowed)
+            idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+            tf = len(match[doc_id])
+            score += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        scores[doc_id] = score
+
+    results = []
+    for doc_id in sorted(scores, key=lambda d: (-scores[d], index.docs[d]["path"]))[:limit]:
+        occurrences = sorted(occ for match in matches for occ in match[doc_id])
+        results.append({"doc": index.docs[doc_id], "score": scores[doc_id],
+                        "count": sum(len(match[doc_id]) for match in matches), "occurrences": occurrences})
+    return results
+
+def print_results(results: List[Dict], root_dir: str = BOOK_DIR) -> None:
+    for rank, result in enumerate(results, 1):
+        doc = result["doc"]
+        print(f"\n[{rank}] {doc['path']} ({doc['lang']}) — {doc['title']}  "
+              f"[score {result['score']:.2f}, {result['count']} occurrences]")
+        try:
+            # newline="" : mêmes caractères que le texte indexé (\r\n compte pour deux), positions identiques
+            with open(os.path.join(root_dir, doc["path"]), "r", encoding="utf-8", newline="") as f:
+                text = f.read()
+        except OSError:
+            continue
+        shown = set()
+        for _, char_pos, words in result["occurrences"]:
+            section = section_of(doc, char_pos)
+            if len(shown) >= SNIPPETS_PER_HIT or (section, char_pos // (2 * SNIPPET_CHARS)) in shown:
+                continue
+            shown.add((section, char_pos // (2 * SNIPPET_CHARS)))
+            # L'occurrence s'étend jusqu'à la fin de son dernier mot (expression entre guillemets)
+            tokens = TOKEN_RE.finditer(text, char_pos)
+            end = char_pos
+            for _, match in zip(range(words), tokens):
+                end = match.end()
+            length = end - char_pos
+            print(f"    § {section or doc['title']} : {snippet(text, char_pos, length)}")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Index plein texte du livre (sources EN et traductions FR) et recherche")
+    parser.add_argument("query", nargs="*",
+                        help='Termes recherchés ; "expression exacte" entre guillemets, préfixe* (sans requête : construit l\'index)')
+    parser.add_argument("--lang", choices=["fr", "en"], help="Limite la recherche aux traductions ou aux sources")
+    parser.add_argument("-n", "--limit", type=int, default=DEFAULT_LIMIT, help="Nombre maximum de fichiers affichés")
+    parser.add_argument("--rebuild", action="store_true", help="Reconstruit l'index entièrement")
+    parser.add_argument("--no-update", action="store_true",
+                        help="Interroge l'index tel quel, sans vérifier si des fichiers ont changé")
+    parser.add_argument("--index", default=INDEX_PATH, help="Fichier d'index")
+    args = parser.parse_args()
+
+    if not os.path.isdir(BOOK_DIR):
+        print(f"[ERREUR] Le dossier '{BOOK_DIR}' n'existe pas.")
+        return
+
+    if args.rebuild or not args.query or not args.no_update:
+        t_start = time.perf_counter()
+        stats = build_index(BOOK_DIR, args.index, force=args.rebuild)
+        if stats["reindexed"] or not args.query:
+            print(f"[INDEX] {stats['files']} fichiers ({stats['reindexed']} indexés, {stats['reused']} repris), "
+                  f"{stats['terms']} termes, {stats['bytes']/1024:.0f} Ko en {time.perf_counter()-t_start:.2f}s "
+                  f"-> {args.index}")
+    if not args.query:
+        return
+
+    index = open_index(args.index)
+    if index is None:
+        print("[ERREUR] Aucun index : lancez le script sans requête pour le construire.")
+        return
+    t_start = time.perf_counter()
+    results = search(index, " ".join(args.query), args.lang, args.limit)
+    elapsed = (time.perf_counter() - t_start) * 1000
+    print_results(results)
+    print(f"\n{len(results)} fichiers trouvés en {elapsed:.1f} ms")
+    index.close()
+
+if __name__ == "__main__":
+    main()
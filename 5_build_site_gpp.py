@@ -0,0 +1,322 @@
+import os
+import re
+import gzip
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import importlib
+from html import escape
+from typing import Dict, List, Optional, Tuple
+import gpp_metrics
+
+try:
+    import brotli  # Optionnel : copies .br en plus des copies .gz
+except ImportError:
+    brotli = None
+
+# Rendu des chapitres, ordre des fichiers et métadonnées : exactement ceux de l'EPUB
+epub = importlib.import_module("3_create_epub_builder_gpp")
+
+# --- CONFIGURATION ---
+
+BOOK_DIR = epub.BOOK_DIR
+SITE_DIR = "game-programming-patterns-fr"
+# Liste des fichiers de la dernière construction : seuls ceux-là peuvent être supprimés ensuite
+MANIFEST_NAME = ".site-manifest.json"
+ASSETS_DIR = "assets"
+# Fichiers servis précompressés (gzip, et brotli si le module est installé) : les images le sont déjà
+COMPRESSED_TYPES = (".html", ".css", ".js", ".svg", ".json")
+MIN_COMPRESS_BYTES = 256
+
+SITE_STYLESHEET = epub.STYLESHEET + """
+.shell { display: flex; min-height: 100vh; margin: 0; }
+.shell nav.toc { flex: 0 0 18em; padding: 1em; border-right: 1px solid #ddd; font-family: sans-serif; font-size: 0.9em; }
+.shell nav.toc ol { padding-left: 1.2em; }
+.shell nav.toc a[aria-current] { font-weight: bold; }
+.shell main { flex: 1; min-width: 0; max-width: 45em; }
+nav.pager { display: flex; justify-content: space-between; font-family: sans-serif; margin: 2em 0; }
+@media (max-width: 50em) { .shell { display: block; } .shell nav.toc { border-right: none; } }
+"""
+
+# Script de la page d'accueil : un clic dans la table des matières charge seulement le <main> du chapitre,
+# sans recharger la page. Chaque chapitre reste une page complète (liens directs, navigation sans JavaScript).
+SHELL_SCRIPT = """(function () {
+  var main = document.querySelector("main"), pages = {};
+  function fetchPage(href) {
+    if (!pages[href]) {
+      pages[href] = fetch(href).then(function (r) {
+        if (!r.ok) { throw new Error(r.status); }
+        return r.text();
+      });
+    }
+    return pages[href];
+  }
+  function show(href, push) {
+    fetchPage(href).then(function (html) {
+      var page = new DOMParser().parseFromString(html, "text/html");
+      main.innerHTML = page.querySelector("main").innerHTML;
+      document.title = page.title;
+      document.querySelectorAll("nav.toc a").forEach(function (a) {
+        if (a.getAttribute("href") === href) { a.setAttribute("aria-current", "page"); }
+        else { a.removeAttribute("aria-current"); }
+      });
+      if (push) { history.pushState({ href: href }, "", "#" + href); }
+      window.scrollTo(0, 0);
+    }).catch(function () { location.href = href; });
+  }
+  document.addEventListener("click", function (event) {
+    var a = event.target.closest("a[data-chapter]");
+    if (!a || event.ctrlKey || event.metaKey || event.shiftKey || event.button) { return; }
+    event.preventDefault();
+    show(a.getAttribute("href"), true);
+  });
+  // Préchargement au survol : le chapitre est souvent déjà là au moment du clic
+  document.addEventListener("mouseover", function (event) {
+    var a = event.target.closest && event.target.closest("a[data-chapter]");
+    if (a) { fetchPage(a.getAttribute("href")); }
+  });
+  window.addEventListener("popstate", function () {
+    if (location.hash.length > 1) { show(location.hash.slice(1), false); }
+  });
+  if (location.hash.length > 1) { show(location.hash.slice(1), false); }
+})();
+"""
+
+TOC_LINK_RE = re.compile(r'\[([^\]]+)\]\(([^)]+\.md)\)')
+SECTION_BODY_RE = re.compile(r'<section epub:type="chapter">\n(.*)\n</section>', re.DOTALL)
+
+# --- STRUCTURE DU LIVRE ---
+
+def read_book_sections(root_dir: str = BOOK_DIR) -> Dict[str, str]:
+    """Section (« I. Introduction »...) de chaque chapitre source d'après book/README.md, par chemin normalisé."""
+    sections = {}
+    readme_path = os.path.join(root_dir, "README.md")
+    if not os.path.exists(readme_path):
+        return sections
+    section = ""
+    with open(readme_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("## "):
+                section = line[3:].strip()
+                continue
+            match = TOC_LINK_RE.search(line)
+            if match:
+                sections[os.path.normpath(os.path.join(root_dir, match.group(2)))] = section
+    return sections
+
+def page_name(path: str, used: set) -> str:
+    """Nom stable de la page d'un chapitre, d'après son dossier (« 02-command.html »)."""
+    base = os.path.basename(os.path.dirname(path)) or os.path.splitext(os.path.basename(path))[0]
+    name, n = f"{base}.html", 2
+    while name in used:
+        name, n = f"{base}-{n}.html", n + 1
+    used.add(name)
+    return name
+
+# --- ÉCRITURE ---
+
+def hashed_name(name: str, data: bytes) -> str:
+    """style.css -> style.3f2a9c1b.css : le nom change avec le contenu, le fichier peut être mis en cache à vie."""
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:8]}{ext}"
+
+def write_if_changed(path: str, data: bytes) -> bool:
+    """Écrit le fichier (et ses copies compressées) seulement si son contenu change. Retourne True s'il a été écrit."""
+    variants = [path]
+    if path.endswith(COMPRESSED_TYPES) and len(data) >= MIN_COMPRESS_BYTES:
+        variants += [f"{path}.gz"] + ([f"{path}.br"] if brotli else [])
+    for stale in (f"{path}.gz", f"{path}.br"):
+        # Fichier devenu trop petit pour être compressé, ou brotli désinstallé : l'ancienne copie serait servie
+        if stale not in variants and os.path.exists(stale):
+            os.remove(stale)
+    if all(os.path.exists(variant) for variant in variants):
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    outputs = {path: data}
+    with gpp_metrics.span("compress"):
+        if len(variants) > 1:
+            # mtime=0 : la copie .gz ne dépend que du contenu (constructions reproductibles)
+            outputs[f"{path}.gz"] = gzip.compress(data, compresslevel=9, mtime=0)
+        if brotli and len(variants) > 2:
+            outputs[f"{path}.br"] = brotli.compress(data, quality=11)
+    with gpp_metrics.span("disk.write"):
+        for target, content in outputs.items():
+            tmp_path = f"{target}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, target)
+    return True
+
+def prune_site(site_dir: str, produced: set) -> int:
+    """
+    Supprime les fichiers de la construction précédente qui ne sont plus produits (chapitres retirés,
+    anciennes versions des assets), puis enregistre la liste courante. Un fichier que ce script
+    n'a pas écrit n'est jamais supprimé.
+    """
+    manifest_path = os.path.join(site_dir, MANIFEST_NAME)
+    previous = []
+    if os.path.exists(manifest_path):
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            print(f"[ATTENTION] {manifest_path} illisible : aucun fichier obsolète supprimé.")
+    current = sorted(os.path.relpath(path, site_dir).replace(os.sep, "/") for path in produced)
+    removed = 0
+    for relpath in set(previous) - set(current):
+        for path in (relpath, f"{relpath}.gz", f"{relpath}.br"):
+            full_path = os.path.join(site_dir, path)
+            if os.path.exists(full_path):
+                os.remove(full_path)
+                removed += 1
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(current, f, indent=0)
+    return removed
+
+# --- PAGES ---
+
+def page_html(title: str, stylesheet: str, main: str, book_title: str, nav: str = "", script: str = "") -> str:
+    body = f'<div class="shell">\n{nav}\n<main>\n{main}\n</main>\n</div>' if nav else f"<main>\n{main}\n</main>"
+    script_tag = f'\n<script src="{script}" defer></script>' if script else ""
+    return f"""<!DOCTYPE html>
+<html lang="fr">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{escape(title)} - {escape(book_title)}</title>
+<link rel="stylesheet" href="{stylesheet}">{script_tag}
+</head>
+<body>
+{body}
+</body>
+</html>
+"""
+
+def chapter_main(chapter: Dict, previous: Optional[Tuple[str, str]], following: Optional[Tuple[str, str]]) -> str:
+    """Contenu du chapitre (rendu de l'EPUB) avec images chargées à la demande et liens précédent / suivant."""
+    match = SECTION_BODY_RE.search(chapter["xhtml"])
+    body = match.group(1) if match else chapter["xhtml"]
+    # Images : noms déjà dérivés du contenu dans le rendu EPUB (images/<hash>.png -> assets/<hash>.png)
+    body = body.replace('src="../images/', f'src="{ASSETS_DIR}/')
+    body = re.sub(r'<img\b', '<img loading="lazy" decoding="async"', body)
+    links = [
+        f'<a href="{escape(previous[0])}" rel="prev">← {escape(previous[1])}</a>' if previous else "<span></span>",
+        '<a href="index.html">Sommaire</a>',
+        f'<a href="{escape(following[0])}" rel="next">{escape(following[1])} →</a>' if following else "<span></span>",
+    ]
+    return f'{body}\n<nav class="pager">{"".join(links)}</nav>'
+
+def toc_nav(entries: List[Dict], book_title: str) -> str:
+    """Table des matières hiérarchique (sections du README, puis chapitres) de la page d'accueil."""
+    lines = ['<nav class="toc">', f'<p><a href="index.html">{escape(book_title)}</a></p>']
+    section = None
+    for entry in entries:
+        if entry["section"] != section:
+            if section is not None:
+                lines.append("</ol>")
+            section = entry["section"]
+            if section:
+                lines.append(f"<h2>{escape(section)}</h2>")
+            lines.append("<ol>")
+        lines.append(f'<li><a href="{escape(entry["page"])}" data-chapter>{escape(entry["title"])}</a></li>')
+    if section is not None:
+        lines.append("</ol>")
+    lines.append("</nav>")
+    return "\n".join(lines)
+
+def build_site(files: List[str], site_dir: str = SITE_DIR, metadata_file: str = epub.METADATA_FILE,
+               use_cache: bool = True) -> Dict[str, int]:
+    """
+    Génère le site : une page autonome par chapitre, une page d'accueil (table des matières qui charge
+    les chapitres à la demande), CSS/JS/images aux noms dérivés du contenu, copies .gz/.br.
+    Seuls les fichiers dont le contenu change sont réécrits et recompressés.
+    """
+    metadata = epub.load_metadata(metadata_file)
+    book_title = metadata.get("title", "Game Programming Patterns")
+    sections = read_book_sections()
+    stats = {"chapters": len(files), "rendered": 0, "written": 0, "unchanged": 0, "images": 0, "removed": 0}
+    produced = set()
+
+    def emit(relpath: str, data: bytes) -> None:
+        path = os.path.join(site_dir, relpath)
+        produced.add(path)
+        stats["written" if write_if_changed(path, data) else "unchanged"] += 1
+
+    stylesheet = f"{ASSETS_DIR}/{hashed_name('style.css', SITE_STYLESHEET.encode('utf-8'))}"
+    script = f"{ASSETS_DIR}/{hashed_name('shell.js', SHELL_SCRIPT.encode('utf-8'))}"
+    emit(stylesheet, SITE_STYLESHEET.encode("utf-8"))
+    emit(script, SHELL_SCRIPT.encode("utf-8"))
+
+    # Rendu (cache partagé avec l'EPUB : même position dans le livre, même clé)
+    chapters = []
+    used_names: set = set()
+    for n, path in enumerate(files):
+        chapter_key = os.path.relpath(os.path.dirname(path), BOOK_DIR).replace(os.sep, "/")
+        with gpp_metrics.chapter(chapter_key), gpp_metrics.span("render"):
+            chapter, _, cached = epub.render_chapter_cached(path, n + 1, use_cache)
+        stats["rendered"] += 0 if cached else 1
+        source = os.path.normpath(re.sub(r"[_-]fr\.md$", ".md", path))
+        chapters.append({"chapter": chapter, "page": page_name(path, used_names), "title": chapter["title"],
+                         "section": sections.get(source, "")})
+
+    images = {}
+    for entry in chapters:
+        for source, name in entry["chapter"]["images"].items():
+            images[os.path.basename(name)] = source
+    for name, source in sorted(images.items()):
+        target = os.path.join(site_dir, ASSETS_DIR, name)
+        produced.add(target)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(source, target)
+            stats["images"] += 1
+
+    for n, entry in enumerate(chapters):
+        previous = (chapters[n - 1]["page"], chapters[n - 1]["title"]) if n else None
+        following = (chapters[n + 1]["page"], chapters[n + 1]["title"]) if n + 1 < len(chapters) else None
+        main = chapter_main(entry["chapter"], previous, following)
+        emit(entry["page"], page_html(entry["title"], stylesheet, main, book_title).encode("utf-8"))
+
+    intro = [f"<h1>{escape(book_title)}</h1>"]
+    if metadata.get("description"):
+        intro.append(f"<p>{escape(str(metadata['description']))}</p>")
+    if chapters:
+        intro.append(f'<p><a href="{escape(chapters[0]["page"])}" data-chapter>Commencer la lecture →</a></p>')
+    index = page_html("Sommaire", stylesheet, "\n".join(intro), book_title, toc_nav(chapters, book_title), script)
+    emit("index.html", index.encode("utf-8"))
+
+    stats["removed"] = prune_site(site_dir, produced)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Site HTML statique de l'édition française")
+    parser.add_argument("-o", "--output", default=SITE_DIR, help="Dossier du site")
+    parser.add_argument("--no-cache", action="store_true", help="Re-rend tous les chapitres sans utiliser le cache")
+    parser.add_argument("--report", metavar="FICHIER",
+                        help="Rapport de mesures JSON (+ CSV) de l'exécution (défaut : .cache/metrics/site.json)")
+    args = parser.parse_args()
+
+    if not os.path.exists(BOOK_DIR):
+        print(f"[ERREUR] Le dossier '{BOOK_DIR}' n'existe pas.")
+        return
+    files = epub.sort_files(epub.find_french_files(BOOK_DIR))
+    if not files:
+        print("[ERREUR] Aucun chapitre traduit (_fr.md) trouvé.")
+        return
+    if brotli is None:
+        print("[INFO] Module brotli absent (pip install brotli) : copies .gz seulement.")
+
+    t_start = time.time()
+    stats = build_site(files, args.output, use_cache=not args.no_cache)
+    print(f"[SITE] {stats['chapters']} chapitres ({stats['rendered']} re-rendus), {stats['written']} fichiers écrits, "
+          f"{stats['unchanged']} inchangés, {stats['images']} images copiées, {stats['removed']} fichiers obsolètes "
+          f"supprimés en {time.time()-t_start:.2f}s -> {args.output}/index.html")
+    print(f"[MÉTRIQUES] Rapport : {gpp_metrics.write_report('site', args.report)}")
+
+if __name__ == "__main__":
+    main()
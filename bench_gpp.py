@@ -0,0 +1,499 @@
+import os
+import sys
+import json
+import time
+import zlib
+import shlex
+import shutil
+import random
+import struct
+import argparse
+import platform
+import tempfile
+import threading
+import importlib
+import subprocess
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler, SimpleHTTPRequestHandler
+from functools import partial
+from urllib.parse import urljoin
+from typing import List, Dict, Optional, Any
+
+try:
+    import resource  # Mesure de la mémoire de pointe (indisponible sous Windows)
+except ImportError:
+    resource = None
+
+# --- CONFIGURATION ---
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_FILE = "bench-results.json"
+
+# Étapes mesurables (scripts), et celles exécutées par défaut dans l'ordre du pipeline.
+# "pipeline" enchaîne les trois étapes en un seul processus (run_pipeline_gpp.py).
+STAGES = {
+    "scrape": "1_scrape_gpp",
+    "translate": "2_translate_gpp",
+    "epub": "3_create_epub_builder_gpp",
+    "pipeline": "run_pipeline_gpp",
+}
+DEFAULT_STAGES = ["scrape", "translate", "epub"]
+
+# Livre de test : mêmes noms de sections que get_toc_structure() (1_scrape_gpp.py)
+SECTION_NAMES = [
+    "Introduction",
+    "Design Patterns Revisited",
+    "Sequencing Patterns",
+    "Behavioral Patterns",
+    "Decoupling Patterns",
+    "Optimization Patterns",
+]
+CHAPTER_TITLES = [
+    "Architecture, Performance, and Games", "Command", "Flyweight", "Observer", "Prototype",
+    "Singleton", "State", "Double Buffer", "Game Loop", "Update Method", "Bytecode",
+    "Subclass Sandbox", "Type Object", "Component", "Event Queue", "Service Locator",
+    "Data Locality", "Dirty Flag", "Object Pool", "Spatial Partition",
+]
+WORDS = ("game engine entity component update loop render frame memory cache object pattern "
+         "state event queue buffer player input physics sprite level world data code class "
+         "method pointer design system performance time module").split()
+
+# Serveur Ollama simulé : latence fixe par requête + débits d'évaluation du prompt et de génération
+LLM_LATENCY = 0.05      # secondes par requête (chargement, réseau)
+LLM_TOKENS_PER_S = 200  # tokens générés par seconde
+LLM_PROMPT_TOKENS_PER_S = 2000
+LLM_PARALLEL = 1        # requêtes traitées simultanément (OLLAMA_NUM_PARALLEL)
+CHARS_PER_TOKEN = 4
+
+# --- LIVRE DE TEST ---
+
+def png_bytes(width: int, height: int, seed: int) -> bytes:
+    """Génère une image PNG (dégradé RGB) sans dépendance externe."""
+    rows = b"".join(
+        b"\x00" + bytes(value for x in range(width)
+                        for value in ((x * 7 + seed * 31) % 256, (y * 5 + seed * 17) % 256, (x + y + seed) % 256))
+        for y in range(height))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+def slug(title: str) -> str:
+    return "".join(c if c.isalnum() else "-" for c in title.lower()).strip("-").replace("--", "-")
+
+def sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 20))]
+    if rng.random() < 0.3:
+        words[rng.randrange(len(words))] = f"<code>{rng.choice(WORDS)}()</code>"
+    if rng.random() < 0.2:
+        words[rng.randrange(len(words))] = f'<a href="https://example.com/{rng.choice(WORDS)}">{rng.choice(WORDS)}</a>'
+    return " ".join(words).capitalize() + "."
+
+def chapter_html(title: str, rng: random.Random, paragraphs: int, images: List[str]) -> str:
+    """Page au gabarit du site : navigation, contenu (titres, code, listes, images), pied de page."""
+    body = [f"<h1>{title}</h1>"]
+    for i in range(paragraphs):
+        if i and i % 6 == 0:
+            body.append(f"<h2>{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)}</h2>")
+        body.append("<p>" + " ".join(sentence(rng) for _ in range(rng.randint(2, 5))) + "</p>")
+        if i % 5 == 2:
+            lines = [f"  {rng.choice(WORDS)}_{j} = {rng.choice(WORDS)}->update({j});" for j in range(rng.randint(3, 8))]
+            body.append("<pre><code>void " + rng.choice(WORDS) + "()\n{\n" + "\n".join(lines) + "\n}</code></pre>")
+        if i % 7 == 4:
+            body.append("<ul>" + "".join(f"<li>{sentence(rng)}</li>" for _ in range(3)) + "</ul>")
+        if images and i % max(1, paragraphs // len(images)) == 0 and i // max(1, paragraphs // len(images)) < len(images):
+            src = images[i // max(1, paragraphs // len(images))]
+            body.append(f'<figure><img src="{src}" alt="{title}"></figure>')
+    return ("<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>" + title + "</title>"
+            "<style>body { font-family: serif; }</style></head><body>"
+            "<nav><a href=\"contents.html\">Table of Contents</a></nav>"
+            "<div class=\"content\">" + "\n".join(body) + "</div>"
+            "<footer>© fixture</footer><script>var x = 1;</script></body></html>")
+
+def build_fixture(root: str, chapters: int, paragraphs: int, images: int, seed: int = 1) -> Dict[str, int]:
+    """
+    Génère une copie locale du site (table des matières, préface, sections, chapitres, images).
+    Une image est partagée par toutes les pages pour exercer la déduplication des assets.
+    """
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(root, "images"), exist_ok=True)
+    with open(os.path.join(root, "images", "shared.png"), "wb") as f:
+        f.write(png_bytes(64, 48, 0))
+
+    titles = [CHAPTER_TITLES[i] if i < len(CHAPTER_TITLES) else f"Pattern {i + 1}" for i in range(chapters)]
+    sections: List[List[str]] = [[] for _ in SECTION_NAMES]
+    for i, title in enumerate(titles):
+        sections[i * len(SECTION_NAMES) // max(1, chapters)].append(title)
+
+    links = ['<a href="acknowledgements.html">Acknowledgements</a>']
+    pages = {"acknowledgements": ("Acknowledgements", [])}
+    for name, chapter_titles in zip(SECTION_NAMES, sections):
+        if not chapter_titles:
+            continue
+        links.append(f'<a href="{slug(name)}.html">{name}</a>')
+        pages[slug(name)] = (name, [])
+        for title in chapter_titles:
+            page_images = ["images/shared.png"]
+            for n in range(images):
+                image_name = f"{slug(title)}-{n}.png"
+                with open(os.path.join(root, "images", image_name), "wb") as f:
+                    f.write(png_bytes(rng.randint(120, 320), rng.randint(80, 200), rng.randint(1, 10 ** 6)))
+                page_images.append(f"images/{image_name}")
+            links.append(f'<a href="{slug(title)}.html">{title}</a>')
+            pages[slug(title)] = (title, page_images)
+
+    with open(os.path.join(root, "contents.html"), "w", encoding="utf-8") as f:
+        f.write("<html><body><div class=\"content\">" + "\n".join(links) + "</div></body></html>")
+    for name, (title, page_images) in pages.items():
+        count = paragraphs if page_images else max(2, paragraphs // 4)
+        with open(os.path.join(root, f"{name}.html"), "w", encoding="utf-8") as f:
+            f.write(chapter_html(title, rng, count, page_images))
+
+    total = sum(os.path.getsize(os.path.join(dirpath, name))
+                for dirpath, _, names in os.walk(root) for name in names)
+    return {"pages": len(pages) + 1, "chapters": chapters, "bytes": total}
+
+# --- SERVEURS LOCAUX ---
+
+class ServerStats:
+    """Compteurs d'un serveur local (requêtes, octets), partagés entre ses threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values: Dict[str, int] = {"requests": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def add(self, **counts: int) -> None:
+        with self._lock:
+            for key, value in counts.items():
+                self.values[key] = self.values.get(key, 0) + value
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.values)
+
+class CountingWriter:
+    """Enveloppe wfile pour compter les octets envoyés au client."""
+
+    def __init__(self, wfile: Any, stats: ServerStats):
+        self._wfile = wfile
+        self._stats = stats
+
+    def write(self, data: bytes) -> int:
+        self._stats.add(bytes_out=len(data))
+        return self._wfile.write(data)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._wfile, name)
+
+class CountingMixin:
+    """Compte requêtes et octets échangés ; remplace les logs d'accès."""
+    stats: ServerStats
+
+    def setup(self):
+        super().setup()
+        self.wfile = CountingWriter(self.wfile, self.stats)
+
+    def log_request(self, code="-", size="-"):
+        self.stats.add(requests=1, bytes_in=int(self.headers.get("Content-Length") or 0))
+
+    def log_message(self, format, *args):
+        pass
+
+class SiteHandler(CountingMixin, SimpleHTTPRequestHandler):
+    """Sert le livre de test (gère If-Modified-Since : les pages inchangées répondent 304)."""
+    protocol_version = "HTTP/1.1"
+
+class FakeOllamaHandler(CountingMixin, BaseHTTPRequestHandler):
+    """
+    Imite l'API Ollama utilisée par 2_translate_gpp.py (/api/show, /api/pull, /api/generate).
+    La « traduction » renvoie le prompt tel quel (marqueurs de code compris), au rythme configuré.
+    Le prompt système n'est facturé que s'il diffère du précédent, comme le cache KV d'un modèle chargé.
+    """
+    protocol_version = "HTTP/1.1"
+    latency = LLM_LATENCY
+    tokens_per_s = LLM_TOKENS_PER_S
+    model_tokens_per_s: Dict[str, float] = {}  # Débit propre à certains modèles (ex. modèle de brouillon)
+    prompt_tokens_per_s = LLM_PROMPT_TOKENS_PER_S
+    slots = threading.BoundedSemaphore(LLM_PARALLEL)
+    last_system = None
+
+    def send_json(self, data: Dict[str, Any]) -> None:
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_line(self, data: Dict[str, Any]) -> None:
+        line = (json.dumps(data) + "\n").encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path == "/api/show":
+            return self.send_json({"modelfile": "", "parameters": "", "template": "", "details": {},
+                                   "model_info": {}, "modified_at": "2024-01-01T00:00:00Z"})
+        if self.path == "/api/pull":
+            return self.send_json({"status": "success"})
+        if self.path != "/api/generate":
+            return self.send_json({})
+
+        prompt, system = request.get("prompt", ""), request.get("system", "")
+        text = prompt
+        with self.slots:
+            cls = type(self)
+            prompt_tokens = len(prompt) // CHARS_PER_TOKEN
+            if system != cls.last_system:
+                prompt_tokens += len(system) // CHARS_PER_TOKEN
+                cls.last_system = system
+            eval_count = max(1, len(text) // CHARS_PER_TOKEN)
+            prompt_time = prompt_tokens / self.prompt_tokens_per_s
+            tokens_per_s = self.model_tokens_per_s.get(request.get("model"), self.tokens_per_s)
+            eval_time = eval_count / tokens_per_s
+            self.stats.add(tokens_in=prompt_tokens, tokens_out=eval_count)
+            base = {"model": request.get("model"), "created_at": datetime.now(timezone.utc).isoformat()}
+            final = dict(base, response="", done=True, done_reason="stop",
+                         prompt_eval_count=prompt_tokens, prompt_eval_duration=int(prompt_time * 1e9),
+                         eval_count=eval_count, eval_duration=int(eval_time * 1e9))
+
+            time.sleep(self.latency + prompt_time)
+            if not request.get("stream", True):
+                time.sleep(eval_time)
+                return self.send_json(dict(final, response=text))
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            step = CHARS_PER_TOKEN * 8  # 8 tokens par message
+            try:
+                for start in range(0, len(text), step):
+                    time.sleep(min(step, len(text) - start) / CHARS_PER_TOKEN / tokens_per_s)
+                    self.send_line(dict(base, response=text[start:start + step], done=False))
+                self.send_line(final)
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                # Le client a interrompu la génération (sortie trop longue)
+                self.close_connection = True
+
+def start_server(handler: Any, stats: ServerStats, **handler_kwargs: Any) -> ThreadingHTTPServer:
+    """Démarre un serveur HTTP local sur un port libre, dans un thread d'arrière-plan."""
+    handler.stats = stats
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(handler, **handler_kwargs))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def server_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/"
+
+# --- EXÉCUTION DES ÉTAPES ---
+
+def peak_memory_kb() -> Dict[str, Optional[int]]:
+    """Mémoire résidente de pointe du processus et de ses sous-processus (Ko), None si non mesurable."""
+    if resource is None:
+        return {"peak_rss_kb": None, "peak_children_rss_kb": None}
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    scale = 1024 if sys.platform == "darwin" else 1
+    return {
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale,
+        "peak_children_rss_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // scale,
+    }
+
+def run_stage(stage: str, site_url: str, stats_path: str, stage_args: List[str]) -> None:
+    """
+    Exécuté dans un sous-processus (dans le dossier de travail) : importe le script de l'étape,
+    le fait pointer vers le site local, lance son main() et enregistre sa mémoire de pointe.
+    """
+    sys.path.insert(0, REPO_DIR)
+    module = importlib.import_module(STAGES[stage])
+    scraper = importlib.import_module(STAGES["scrape"]) if stage in ("scrape", "pipeline") else None
+    if scraper:
+        scraper.BASE_URL = site_url
+        scraper.CONTENTS_URL = urljoin(site_url, "contents.html")
+
+    sys.argv = [module.__file__] + stage_args
+    exit_code = 0
+    try:
+        module.main()
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else 1
+
+    stats = dict(peak_memory_kb(), exit_code=exit_code)
+    if scraper:
+        stats["client"] = dict(scraper.HTTP_STATS)
+    with open(stats_path, "w", encoding="utf-8") as f:
+        json.dump(stats, f)
+
+def bench_stage(stage: str, workdir: str, site_url: str, ollama_url: str, stage_args: List[str],
+                servers: Dict[str, ServerStats]) -> Dict[str, Any]:
+    """Lance une étape dans un sous-processus et retourne ses mesures (temps, réseau, mémoire)."""
+    stats_path = os.path.join(workdir, f".bench-{stage}.json")
+    log_path = os.path.join(workdir, f"bench-{stage}.log")
+    env = dict(os.environ, OLLAMA_HOST=ollama_url.rstrip("/"), PYTHONIOENCODING="utf-8")
+    before = {name: stats.snapshot() for name, stats in servers.items()}
+
+    t_start = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        process = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run-stage", stage, "--site-url", site_url,
+             "--stats-file", stats_path, "--stage-args", json.dumps(stage_args)],
+            cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    wall = time.perf_counter() - t_start
+
+    result: Dict[str, Any] = {"wall_s": round(wall, 3), "args": stage_args}
+    try:
+        with open(stats_path, "r", encoding="utf-8") as f:
+            result.update(json.load(f))
+        os.remove(stats_path)
+    except (OSError, ValueError):
+        result["exit_code"] = process.returncode or 1
+    # Détail par sous-étape (réseau, analyse, LLM, disque) issu du rapport gpp_metrics du script
+    try:
+        with open(os.path.join(workdir, ".cache", "metrics", f"{stage}.json"), "r", encoding="utf-8") as f:
+            report = json.load(f)
+        result["spans"] = report["spans"]
+        result["counters"] = report["counters"]
+        if report.get("gauges"):
+            result["gauges"] = report["gauges"]
+    except (OSError, ValueError, KeyError):
+        pass
+    for name, stats in servers.items():
+        after = stats.snapshot()
+        delta = {key: after[key] - before[name].get(key, 0) for key in after}
+        if any(delta.values()):
+            result[name] = delta
+    result["log"] = log_path
+    return result
+
+def git_commit() -> Optional[str]:
+    """Commit courant du dépôt (pour comparer les résultats d'un commit à l'autre)."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_report(results: Dict[str, Any]) -> None:
+    """Affiche un tableau récapitulatif par étape."""
+    print(f"\n{'Étape':<10} {'Temps':>8} {'Requêtes':>9} {'Octets':>10} {'Mémoire':>10}  Statut")
+    for stage, data in results["stages"].items():
+        servers = [data[name] for name in ("site", "ollama") if name in data]
+        requests = sum(server.get("requests", 0) for server in servers)
+        transferred = sum(server.get("bytes_out", 0) + server.get("bytes_in", 0) for server in servers)
+        memory = data.get("peak_rss_kb")
+        print(f"{stage:<10} {data['wall_s']:>7.2f}s {requests:>9} {transferred:>10} "
+              f"{(f'{memory / 1024:.1f} Mo' if memory else '-'):>10}  "
+              f"{'OK' if data.get('exit_code') == 0 else 'ERREUR'}")
+    print(f"{'total':<10} {results['total_wall_s']:>7.2f}s")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark hors ligne du pipeline GPP (site et Ollama simulés en local)")
+    parser.add_argument("-o", "--output", default=RESULTS_FILE, help="Fichier JSON des résultats")
+    parser.add_argument("--label", default="", help="Libellé libre enregistré avec les résultats")
+    parser.add_argument("--stages", default=",".join(DEFAULT_STAGES),
+                        help=f"Étapes à exécuter, séparées par des virgules, parmi : {', '.join(STAGES)}")
+    parser.add_argument("--chapters", type=int, default=12, help="Nombre de chapitres du livre de test")
+    parser.add_argument("--paragraphs", type=int, default=20, help="Paragraphes par chapitre")
+    parser.add_argument("--images", type=int, default=2, help="Images propres à chaque chapitre")
+    parser.add_argument("--seed", type=int, default=1, help="Graine du contenu généré")
+    parser.add_argument("--llm-latency", type=float, default=LLM_LATENCY, help="Latence fixe par requête (s)")
+    parser.add_argument("--llm-tps", type=float, default=LLM_TOKENS_PER_S, help="Tokens générés par seconde")
+    parser.add_argument("--llm-model-tps", action="append", default=[], metavar="MODELE=TPS",
+                        help="Débit propre à un modèle, ex. un modèle de brouillon plus rapide (option répétable)")
+    parser.add_argument("--llm-prompt-tps", type=float, default=LLM_PROMPT_TOKENS_PER_S,
+                        help="Tokens de prompt évalués par seconde")
+    parser.add_argument("--llm-parallel", type=int, default=LLM_PARALLEL,
+                        help="Requêtes traitées simultanément par le serveur simulé")
+    for stage in STAGES:
+        parser.add_argument(f"--{stage}-args", default="", help=f"Arguments passés à l'étape {stage} ({{site}} et {{ollama}} = adresses des serveurs locaux)")
+    parser.add_argument("--workdir", help="Dossier de travail (par défaut : dossier temporaire supprimé à la fin)")
+    # Mode interne : exécution d'une étape dans un sous-processus
+    parser.add_argument("--run-stage", choices=list(STAGES), help=argparse.SUPPRESS)
+    parser.add_argument("--site-url", help=argparse.SUPPRESS)
+    parser.add_argument("--stats-file", help=argparse.SUPPRESS)
+    parser.add_argument("--stage-args", default="[]", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        run_stage(args.run_stage, args.site_url, args.stats_file, json.loads(args.stage_args))
+        return
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        print(f"[ERREUR] Étape(s) inconnue(s) : {', '.join(unknown)}")
+        return
+
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix="gpp-bench-")
+    site_dir = os.path.join(workdir, "site")
+    os.makedirs(workdir, exist_ok=True)
+    print(f"=== BENCHMARK GPP ({workdir}) ===")
+
+    fixture = build_fixture(site_dir, args.chapters, args.paragraphs, args.images, args.seed)
+    print(f"[INFO] Livre de test : {fixture['pages']} pages, {fixture['bytes'] / 1024:.1f} Ko")
+    if os.path.exists(os.path.join(REPO_DIR, "metadata.yaml")):
+        shutil.copy(os.path.join(REPO_DIR, "metadata.yaml"), workdir)
+
+    FakeOllamaHandler.latency = args.llm_latency
+    FakeOllamaHandler.tokens_per_s = args.llm_tps
+    FakeOllamaHandler.model_tokens_per_s = {model: float(tps) for model, _, tps in
+                                            (spec.rpartition("=") for spec in args.llm_model_tps)}
+    FakeOllamaHandler.prompt_tokens_per_s = args.llm_prompt_tps
+    FakeOllamaHandler.slots = threading.BoundedSemaphore(max(1, args.llm_parallel))
+    servers = {"site": ServerStats(), "ollama": ServerStats()}
+    site = start_server(SiteHandler, servers["site"], directory=site_dir)
+    ollama_server = start_server(FakeOllamaHandler, servers["ollama"])
+
+    results: Dict[str, Any] = {
+        "label": args.label,
+        "commit": git_commit(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "fixture": fixture, "paragraphs": args.paragraphs, "images": args.images, "seed": args.seed,
+            "llm_latency": args.llm_latency, "llm_tps": args.llm_tps, "llm_model_tps": FakeOllamaHandler.model_tokens_per_s,
+            "llm_prompt_tps": args.llm_prompt_tps, "llm_parallel": args.llm_parallel,
+        },
+        "stages": {},
+    }
+    t_start = time.perf_counter()
+    try:
+        for stage in stages:
+            print(f"[ÉTAPE] {stage}...")
+            # {site} et {ollama} sont remplacés par l'adresse des serveurs locaux (ex. --endpoint {ollama}=2)
+            stage_args = [arg.format(site=server_url(site), ollama=server_url(ollama_server).rstrip("/"))
+                          for arg in shlex.split(getattr(args, f"{stage}_args"))]
+            data = bench_stage(stage, workdir, server_url(site), server_url(ollama_server), stage_args, servers)
+            results["stages"][stage] = data
+            print(f"  -> {data['wall_s']:.2f}s (journal : {data['log']})")
+            if data.get("exit_code") != 0:
+                print(f"[ERREUR] L'étape {stage} a échoué, arrêt du benchmark.")
+                break
+    finally:
+        site.shutdown()
+        ollama_server.shutdown()
+    results["total_wall_s"] = round(time.perf_counter() - t_start, 3)
+
+    if not args.workdir:
+        # Les journaux disparaissent avec le dossier temporaire
+        for data in results["stages"].values():
+            data.pop("log", None)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    print_report(results)
+    print(f"\nRésultats enregistrés dans {args.output}")
+
+if __name__ == "__main__":
+    main()
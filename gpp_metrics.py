@@ -0,0 +1,142 @@
+import os
+import csv
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Instrumentation partagée par les scripts GPP : durées (spans) et compteurs, globaux et par chapitre.
+# Chaque mesure coûte un appel à perf_counter() et une mise à jour de dict sous verrou : rien n'est
+# écrit pendant l'exécution, le rapport JSON/CSV est produit une seule fois par write_report().
+
+METRICS_DIR = os.path.join(".cache", "metrics")
+
+_lock = threading.Lock()
+_local = threading.local()
+_started = time.time()
+# (nom, chapitre) -> [nombre, total en secondes, maximum] ; chapitre "" = hors chapitre
+_spans: Dict[Tuple[str, str], List[float]] = {}
+_counters: Dict[Tuple[str, str], float] = {}
+# Valeurs calculées (taux, estimations) : la dernière écrite l'emporte, rien n'est additionné
+_gauges: Dict[str, float] = {}
+
+def current_chapter() -> str:
+    """Chapitre associé au thread courant (chaîne vide hors chapitre)."""
+    return getattr(_local, "chapter", "")
+
+@contextmanager
+def chapter(name: str) -> Iterator[None]:
+    """Rattache les mesures faites dans ce bloc (et ce thread) au chapitre `name`."""
+    previous = current_chapter()
+    _local.chapter = name
+    try:
+        yield
+    finally:
+        _local.chapter = previous
+
+def record(name: str, seconds: float, chapter_name: Optional[str] = None) -> None:
+    """Ajoute une durée mesurée ailleurs (ex. durées d'évaluation renvoyées par Ollama)."""
+    key = (name, current_chapter() if chapter_name is None else chapter_name)
+    with _lock:
+        stats = _spans.get(key)
+        if stats is None:
+            _spans[key] = [1, seconds, seconds]
+        else:
+            stats[0] += 1
+            stats[1] += seconds
+            if seconds > stats[2]:
+                stats[2] = seconds
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Mesure la durée du bloc sous le nom `name`."""
+    t_start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - t_start)
+
+def count(name: str, value: float = 1, chapter_name: Optional[str] = None) -> None:
+    """Incrémente un compteur (blocs, tokens, tentatives, succès de cache...)."""
+    key = (name, current_chapter() if chapter_name is None else chapter_name)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def gauge(name: str, value: float) -> None:
+    """Enregistre une valeur dérivée (taux d'escalade, temps gagné...), remplacée à chaque appel."""
+    with _lock:
+        _gauges[name] = value
+
+def summary() -> Dict[str, object]:
+    """Agrège les mesures : totaux de l'exécution et détail par chapitre."""
+    totals: Dict[str, Dict[str, float]] = {}
+    counters: Dict[str, float] = {}
+    chapters: Dict[str, Dict[str, Dict]] = {}
+    with _lock:
+        spans = {key: list(stats) for key, stats in _spans.items()}
+        counts = dict(_counters)
+        gauges = dict(sorted(_gauges.items()))
+
+    for (name, chapter_name), (n, total, longest) in sorted(spans.items()):
+        entry = totals.setdefault(name, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+        entry["count"] += n
+        entry["total_s"] += total
+        entry["max_s"] = max(entry["max_s"], longest)
+        if chapter_name:
+            chapters.setdefault(chapter_name, {"spans": {}, "counters": {}})["spans"][name] = {
+                "count": n, "total_s": round(total, 6), "max_s": round(longest, 6)}
+    for (name, chapter_name), value in sorted(counts.items()):
+        counters[name] = counters.get(name, 0) + value
+        if chapter_name:
+            chapters.setdefault(chapter_name, {"spans": {}, "counters": {}})["counters"][name] = value
+
+    for entry in totals.values():
+        entry["total_s"] = round(entry["total_s"], 6)
+        entry["max_s"] = round(entry["max_s"], 6)
+    return {"spans": totals, "counters": counters, "gauges": gauges, "chapters": chapters}
+
+def write_report(script: str, path: Optional[str] = None) -> str:
+    """
+    Écrit le rapport de l'exécution en JSON (path, par défaut .cache/metrics/<script>.json)
+    et en CSV à côté (une ligne par mesure : chapitre, type, nom, nombre, total, max).
+    Retourne le chemin du fichier JSON.
+    """
+    path = path or os.path.join(METRICS_DIR, f"{script}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    data = summary()
+    report = {
+        "script": script,
+        "started": datetime.fromtimestamp(_started, timezone.utc).isoformat(timespec="seconds"),
+        "wall_s": round(time.time() - _started, 3),
+        **data,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+    with open(os.path.splitext(path)[0] + ".csv", "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["chapter", "kind", "name", "count", "total_s", "max_s"])
+        for name, entry in data["spans"].items():
+            writer.writerow(["", "span", name, entry["count"], entry["total_s"], entry["max_s"]])
+        for name, value in data["counters"].items():
+            writer.writerow(["", "counter", name, value, "", ""])
+        for name, value in data["gauges"].items():
+            writer.writerow(["", "gauge", name, value, "", ""])
+        for chapter_name, entry in data["chapters"].items():
+            for name, stats in entry["spans"].items():
+                writer.writerow([chapter_name, "span", name, stats["count"], stats["total_s"], stats["max_s"]])
+            for name, value in entry["counters"].items():
+                writer.writerow([chapter_name, "counter", name, value, "", ""])
+    return path
+
+def reset() -> None:
+    """Remet les mesures à zéro (plusieurs exécutions dans un même processus)."""
+    global _started
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _gauges.clear()
+        _started = time.time()
@@ -0,0 +1,207 @@
+import os
+import time
+import queue
+import argparse
+import importlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
+import gpp_metrics
+
+# Les trois étapes sont importées comme modules : leurs fonctions sont appelées directement,
+# sans passer par un script par étape.
+scrape = importlib.import_module("1_scrape_gpp")
+translate = importlib.import_module("2_translate_gpp")
+epub = importlib.import_module("3_create_epub_builder_gpp")
+
+# --- CONFIGURATION ---
+
+# Chapitres en attente entre deux étapes : le scraping ne prend pas plus de QUEUE_SIZE chapitres
+# d'avance sur la traduction, ni la traduction sur le rendu.
+QUEUE_SIZE = 4
+# Fin de flux dans une file
+DONE = None
+
+def put_until_done(output: "queue.Queue[Optional[str]]", item: Optional[str], consumer: Future) -> bool:
+    """
+    output.put(item), sans bloquer indéfiniment sur une file pleine si l'étape qui la lit s'est arrêtée.
+    Retourne False si cette étape est terminée (l'élément n'a pas été transmis).
+    """
+    while not consumer.done():
+        try:
+            output.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def scrape_stage(jobs: List[Tuple[str, str, str]], readme: Tuple[List[str], List[Tuple[int, str, str, str]]],
+                 workers: int, output: "queue.Queue[Optional[str]]") -> List[str]:
+    """
+    Scrape les pages (en parallèle) et transmet chaque chapitre à la traduction dès qu'il est prêt,
+    dans l'ordre de la table des matières (le contexte passe d'un chapitre au suivant).
+    Le README du livre est écrit une fois toutes les pages traitées.
+    """
+    filenames = []
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = [executor.submit(scrape.scrape_job, url, save_dir, title) for url, save_dir, title in jobs]
+            for (_, save_dir, _), future in zip(jobs, futures):
+                filename = future.result()
+                filenames.append(filename)
+                if filename:
+                    output.put(os.path.join(save_dir, filename))
+        scrape.write_readme(readme[0], readme[1], filenames)
+    finally:
+        output.put(DONE)
+    return filenames
+
+def translate_stage(source: "queue.Queue[Optional[str]]", output: "queue.Queue[Optional[str]]",
+                    dispatcher: "translate.OllamaDispatcher", memory: Optional["translate.TranslationMemory"],
+                    force: bool, stream: bool, rendering: Future) -> Dict[str, int]:
+    """
+    Traduit les chapitres au fur et à mesure qu'ils arrivent et transmet les _fr.md terminés au rendu.
+    Si le rendu s'arrête sur une erreur, son exception est relancée ici plutôt que d'attendre une file pleine.
+    """
+    totals = {"files": 0, "chunks": 0, "failures": 0}
+    summaries = translate.SummaryCache()
+    global_context = ""
+    try:
+        while True:
+            md_path = source.get()
+            if md_path is DONE:
+                return totals
+            print(f"\n[TRADUCTION] {os.path.relpath(md_path, translate.OUTPUT_DIR)}")
+            result = translate.translate_file(md_path, dispatcher, memory, global_context, force=force, stream=stream,
+                                              summaries=summaries)
+            totals["files"] += 1
+            totals["chunks"] += result["chunks"]
+            totals["failures"] += result["failures"]
+            global_context = result["context"]
+            if result["status"] != "incomplete" and os.path.exists(result["output_path"]):
+                if not put_until_done(output, result["output_path"], rendering):
+                    rendering.result()
+                    raise RuntimeError("Le rendu s'est arrêté avant la fin de la traduction.")
+    finally:
+        put_until_done(output, DONE, rendering)
+
+def render_stage(source: "queue.Queue[Optional[str]]", order: Dict[str, int]) -> int:
+    """
+    Rend chaque chapitre traduit dès qu'il arrive, pour remplir le cache de rendu de l'EPUB :
+    l'assemblage final n'a plus qu'à relire le cache et écrire l'archive.
+    Retourne le nombre de chapitres rendus.
+    """
+    rendered = 0
+    while True:
+        path = source.get()
+        if path is DONE:
+            return rendered
+        index = order.get(os.path.normpath(path))
+        if index is None:
+            continue
+        chapter_key = os.path.relpath(os.path.dirname(path), epub.BOOK_DIR).replace(os.sep, "/")
+        with gpp_metrics.chapter(chapter_key), gpp_metrics.span("prerender"):
+            _, _, cached = epub.render_chapter_cached(path, index)
+        rendered += 0 if cached else 1
+
+def expected_order(jobs: List[Tuple[str, str, str]]) -> Dict[str, int]:
+    """
+    Position (1, 2, ...) de chaque chapitre traduit dans l'EPUB final, telle que build_epub() la calculera :
+    fichiers _fr.md déjà présents + ceux que ce run va produire, triés par sort_files().
+    La position fait partie de la clé du cache de rendu.
+    """
+    paths = {os.path.normpath(path) for path in epub.find_french_files(epub.BOOK_DIR)}
+    for _, save_dir, title in jobs:
+        paths.add(os.path.normpath(os.path.join(save_dir, f"{scrape.slugify_name(title)}_fr.md")))
+    return {path: n + 1 for n, path in enumerate(epub.sort_files(sorted(paths)))}
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Pipeline GPP complet : scraping, traduction et EPUB en parallèle, chapitre par chapitre")
+    parser.add_argument("--workers", type=int, default=scrape.DEFAULT_WORKERS,
+                        help="Nombre de pages récupérées en parallèle")
+    parser.add_argument("--convert-workers", type=int, default=scrape.CONVERT_WORKERS,
+                        help="Processus de conversion HTML -> Markdown (0 = dans les threads de récupération)")
+    parser.add_argument("--endpoint", action="append", metavar="HOTE[=N]",
+                        help="Instance Ollama à utiliser avec N requêtes simultanées (option répétable)")
+    parser.add_argument("--draft-model", metavar="MODELE",
+                        help="Mode cascade de la traduction : modèle rapide d'abord (voir 2_translate_gpp.py)")
+    parser.add_argument("--no-memory", action="store_true", help="Désactive la mémoire de traduction (cache SQLite)")
+    parser.add_argument("--stream", action="store_true", help="Traduction en streaming (voir 2_translate_gpp.py)")
+    parser.add_argument("--force", action="store_true",
+                        help="Retraduit tout, sans réutiliser le manifeste ni le journal des runs précédents")
+    parser.add_argument("-o", "--output", default=epub.EPUB_NAME, help="Fichier EPUB à produire")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE,
+                        help="Chapitres en attente au maximum entre deux étapes")
+    parser.add_argument("--report", metavar="FICHIER",
+                        help="Rapport de mesures JSON (+ CSV) de l'exécution (défaut : .cache/metrics/pipeline.json)")
+    args = parser.parse_args()
+
+    print("=== PIPELINE GPP ===")
+    t_start = time.time()
+    translate.DRAFT_MODEL = args.draft_model
+    dispatcher = translate.create_dispatcher(args.endpoint)
+    memory = None if args.no_memory else translate.TranslationMemory()
+
+    scrape.setup_directories()
+    structure = scrape.get_toc_structure()
+    if not structure:
+        print("[ERREUR] Structure non récupérée.")
+        return
+    jobs, readme_content, readme_slots = scrape.plan_book(structure)
+    order = expected_order(jobs)
+
+    # Processus de conversion démarrés avant les threads des étapes
+    scrape.CONVERSION_POOL = scrape.start_conversion_pool(args.convert_workers)
+    scraped: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=max(1, args.queue_size))
+    translated: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=max(1, args.queue_size))
+    try:
+        with ThreadPoolExecutor(max_workers=2) as stages:
+            scraping = stages.submit(scrape_stage, jobs, (readme_content, readme_slots), args.workers, scraped)
+            rendering = stages.submit(render_stage, translated, order)
+            try:
+                totals = translate_stage(scraped, translated, dispatcher, memory, args.force, args.stream, rendering)
+            except BaseException:
+                # Traduction interrompue : le rendu abandonne les chapitres en attente et s'arrête
+                while True:
+                    try:
+                        translated.get_nowait()
+                    except queue.Empty:
+                        break
+                put_until_done(translated, DONE, rendering)
+                raise
+            finally:
+                # Une étape de traduction interrompue ne doit pas laisser le scraping bloqué sur une file pleine
+                while not scraping.done():
+                    try:
+                        scraped.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+            filenames = scraping.result()
+            prerendered = rendering.result()
+    finally:
+        if scrape.CONVERSION_POOL is not None:
+            scrape.CONVERSION_POOL.shutdown()
+            scrape.CONVERSION_POOL = None
+        if memory:
+            memory.close()
+    t_translated = time.time()
+
+    files = epub.sort_files(epub.find_french_files(epub.BOOK_DIR))
+    result = epub.build_epub(files, args.output) if files else None
+
+    print(f"\n[RÉSUMÉ] {sum(1 for name in filenames if name)}/{len(jobs)} pages, {totals['files']} fichiers traduits "
+          f"({totals['chunks']} blocs, {totals['failures']} en échec), {prerendered} chapitres rendus en parallèle")
+    if result is not None:
+        chapter_count, image_count, rendered = result
+        print(f"  EPUB : {args.output} ({chapter_count} chapitres dont {rendered} rendus à l'assemblage, "
+              f"{image_count} images) en {time.time()-t_translated:.2f}s après la traduction")
+    elif files:
+        print(f"  EPUB déjà à jour : {args.output}")
+    cascade = translate.cascade_report()
+    if cascade:
+        print(f"  Cascade : {cascade}")
+    print(f"[MÉTRIQUES] Rapport : {gpp_metrics.write_report('pipeline', args.report)}")
+    print(f"\n=== PIPELINE TERMINÉ en {time.time()-t_start:.1f}s ===")
+
+if __name__ == "__main__":
+    main()